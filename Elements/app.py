@@ -4,10 +4,14 @@ from tkinter import ttk
 import json
 import os
 import platform
+import sqlite3
 from Elements.category_manager import CategoryManager
 from Elements.category_dialog import CategoryManagerDialog
+from Elements.snippet_store import SnippetStore
 from Encryption.encryption_util import EncryptionUtil
 from Expander.Text_expander import TextExpander
+from Expander.clipboard import TkClipboard
+from Expander.matcher import DELIMITER
 
 """ Tray solution for linux wayland """
 if platform.system() == "Linux":
@@ -24,12 +28,19 @@ class TEx(ctk.CTk):
             self.withdraw()
         self.title("TEx")
         self.data_file = "user/Expansions.json"
+        self.store = SnippetStore(json_file=self.data_file)
+        # data_version of the store when abbrev_dict was loaded; None forces a reload
+        self.store_version = None
+        self.settings_file = "user/Settings.json"
         self.current_tag = "emoji"
         self.abbrev_dict = {}
         self.editing_item_id = None
         self.category_manager = CategoryManager()
         self.encryption_key = self.get_or_create_key()
-        self.text_expander = TextExpander()
+        self.text_expander = TextExpander(clipboard=TkClipboard(self))
+        settings = self.load_settings()
+        if 'delimiters' in settings:
+            self.text_expander.set_delimiters(settings['delimiters'])
         self.text_expander.start_listening()
         self.tray_icon = TrayIcon(self)
         self.setup_ui()
@@ -231,81 +242,119 @@ class TEx(ctk.CTk):
                     self.current_tag = None
                     self.tree.delete(*self.tree.get_children())
                     self.abbrev_dict = {}
+                    self.store_version = None
                 return 
 
         self.current_tag = tag_name
-        self.load_abbreviations()
-        self.apply_abbreviations()
-        self.update_abbreviation_listbox()
+        # The loaded (and decrypted) abbreviations cover every category, so
+        # switching pages only reloads if something else changed the store
+        if self.store_version is None or self.store.data_version() != self.store_version:
+            self.load_abbreviations()
+            self.apply_abbreviations()
+        else:
+            self.update_abbreviation_listbox()
+
+    def refresh_abbreviations(self):
+        """Reload the abbreviations from the store and re-apply them"""
+        self.store_version = None
+        self.switch_page(self.current_tag)
+
+    def load_settings(self):
+        """Optional expander settings, e.g. {"delimiters": " \\n\\t.,;"}"""
+        if not os.path.exists(self.settings_file):
+            return {}
+        try:
+            with open(self.settings_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error loading settings: {e}")
+            return {}
 
     def load_abbreviations(self):
         self.abbrev_dict = {}
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    loaded_data = json.load(f)
-                    for source, data in loaded_data.items():
-                        if isinstance(data, dict) and 'tag' in data:
-                            category_data = self.category_manager.get_category(data['tag'])
-                            
-                            if category_data and category_data.get('is_encrypted', False):
-                                original_encrypted_value = data['replacement'] 
-                                
-                                if self.encryption_key:
-                                    decrypted_replacement = EncryptionUtil.decrypt_data(original_encrypted_value, self.encryption_key)
-                                    self.abbrev_dict[source] = {
-                                        'replacement': decrypted_replacement,
-                                        'original_encrypted': original_encrypted_value, 
-                                        'ignored': data.get('ignored', False),
-                                        'tag': data['tag']
-                                    }
-                                else:
-                                    self.abbrev_dict[source] = {
-                                        'replacement': "[ENCRYPTED - LOCKED]",
-                                        'original_encrypted': original_encrypted_value,
-                                        'ignored': data.get('ignored', False),
-                                        'tag': data['tag']
-                                    }
-                            else:
-                                self.abbrev_dict[source] = data
+        try:
+            self.store_version = self.store.data_version()
+            loaded_data = self.store.load()
+            for source, data in loaded_data.items():
+                if isinstance(data, dict) and 'tag' in data:
+                    category_data = self.category_manager.get_category(data['tag'])
+
+                    if category_data and category_data.get('is_encrypted', False):
+                        original_encrypted_value = data['replacement']
+
+                        if self.encryption_key:
+                            decrypted_replacement = EncryptionUtil.decrypt_data(original_encrypted_value, self.encryption_key)
+                            self.abbrev_dict[source] = {
+                                **data,
+                                'replacement': decrypted_replacement,
+                                'original_encrypted': original_encrypted_value,
+                                'ignored': data.get('ignored', False),
+                                'tag': data['tag']
+                            }
                         else:
-                            self.abbrev_dict[source] = {'replacement': data, 'ignored': False, 'tag': 'text'}
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"Error loading abbreviations: {e}")
-                self.abbrev_dict = {}
+                            self.abbrev_dict[source] = {
+                                **data,
+                                'replacement': "[ENCRYPTED - LOCKED]",
+                                'original_encrypted': original_encrypted_value,
+                                'ignored': data.get('ignored', False),
+                                'tag': data['tag']
+                            }
+                    else:
+                        self.abbrev_dict[source] = data
+                else:
+                    self.abbrev_dict[source] = {'replacement': data, 'ignored': False, 'tag': 'text'}
+        except sqlite3.Error as e:
+            print(f"Error loading abbreviations: {e}")
+            self.abbrev_dict = {}
+            self.store_version = None
         self.update_abbreviation_listbox()
 
-    def save_abbreviations(self):
-        data_to_save = {}
-        for source, data in self.abbrev_dict.items():
-            category_data = self.category_manager.get_category(data['tag'])
-            if category_data and category_data.get('is_encrypted', False):
-                if self.encryption_key:
+    def stored_record(self, source, data):
+        """The record to store for an abbreviation, encrypted if its category
+        is; None if it can't be stored while the category is locked"""
+        category_data = self.category_manager.get_category(data['tag'])
+        if category_data and category_data.get('is_encrypted', False):
+            if self.encryption_key:
+                # original_encrypted is only kept while the replacement is
+                # unchanged, so it can be stored again without re-encrypting
+                encrypted_replacement = data.get('original_encrypted')
+                if encrypted_replacement is None:
                     encrypted_replacement = EncryptionUtil.encrypt_data(data['replacement'], self.encryption_key)
-                    data_to_save[source] = {
-                        'replacement': encrypted_replacement,
-                        'ignored': data.get('ignored', False),
-                        'tag': data['tag']
-                    }
-                else:
-                    if 'original_encrypted' in data and data['original_encrypted'] is not None:
-                        data_to_save[source] = {
-                            'replacement': data['original_encrypted'],
-                            'ignored': data.get('ignored', False),
-                            'tag': data['tag']
-                        }
-                    else:
-  
-                        print(f"Warning: Skipping save for new/unencryptable item '{source}' in locked category '{data['tag']}'.")
-                        continue
-            else:
-                data_to_save[source] = data
-        
-        try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data_to_save, f, ensure_ascii=False, indent=4)
-        except IOError as e:
-            print(f"Failed to save abbreviations: {e}")
+                    data['original_encrypted'] = encrypted_replacement
+                return {
+                    **self.entry_options(data),
+                    'replacement': encrypted_replacement,
+                    'ignored': data.get('ignored', False),
+                    'tag': data['tag']
+                }
+            if 'original_encrypted' in data and data['original_encrypted'] is not None:
+                return {
+                    **self.entry_options(data),
+                    'replacement': data['original_encrypted'],
+                    'ignored': data.get('ignored', False),
+                    'tag': data['tag']
+                }
+            print(f"Warning: Skipping save for new/unencryptable item '{source}' in locked category '{data['tag']}'.")
+            return None
+        return data
+
+    def save_abbreviation(self, source, renamed_from=None):
+        """Write one abbreviation to the store, removing its old name in the
+        same transaction when it was renamed"""
+        record = self.stored_record(source, self.abbrev_dict[source])
+        removed = [renamed_from] if renamed_from not in (None, source) else []
+        if record is not None or removed:
+            self.store.put_many({source: record} if record is not None else {}, removed)
+
+    def delete_abbreviations(self, sources):
+        """Remove abbreviations from the store"""
+        self.store.delete_many(sources)
+
+    @staticmethod
+    def entry_options(data):
+        """Per-entry fields beyond the ones the editor manages (e.g. 'trigger')"""
+        return {k: v for k, v in data.items()
+                if k not in ('replacement', 'ignored', 'tag', 'original_encrypted')}
 
     def update_abbreviation_listbox(self):
         self.tree.delete(*self.tree.get_children())
@@ -325,13 +374,18 @@ class TEx(ctk.CTk):
 
     def apply_abbreviations(self):
         """Apply all active and decrypted abbreviations to the text expander"""
-        self.text_expander.clear_abbreviations()
-    
-        for source, data in self.abbrev_dict.items():
-            if isinstance(data, dict) and not data.get('ignored', False):
-                if not data['replacement'].startswith("[DECRYPTION FAILED") and \
-                   not data['replacement'].startswith("[ENCRYPTED - LOCKED]"):
-                    self.text_expander.add_abbreviation(source, data['replacement'])
+        categories = self.category_manager.get_all_categories()
+        no_scope = {}
+        self.text_expander.set_abbreviations(
+            (source, data['replacement'], data.get('trigger', DELIMITER),
+             data.get('propagate_case', False), data.get('regex', False),
+             categories.get(data.get('tag'), no_scope).get('apps'),
+             categories.get(data.get('tag'), no_scope).get('exclude_apps'))
+            for source, data in self.abbrev_dict.items()
+            if isinstance(data, dict) and not data.get('ignored', False)
+            and not data['replacement'].startswith("[DECRYPTION FAILED")
+            and not data['replacement'].startswith("[ENCRYPTED - LOCKED]")
+        )
     
     def add_or_edit_abbreviation(self):
         source = self.nameEntry.get().strip()
@@ -346,11 +400,15 @@ class TEx(ctk.CTk):
             return
 
         original_encrypted_to_preserve = None
+        options = {}
+        original_source = None
 
         if self.editing_item_id:
             original_source = self.tree.item(self.editing_item_id)['values'][1]
             if original_source in self.abbrev_dict:
+                options = self.entry_options(self.abbrev_dict[original_source])
                 if self.abbrev_dict[original_source].get('tag') == self.current_tag and \
+                   self.abbrev_dict[original_source].get('replacement') == replacement and \
                    self.category_manager.get_category(self.current_tag).get("is_encrypted", False):
                     original_encrypted_to_preserve = self.abbrev_dict[original_source].get('original_encrypted')
 
@@ -360,12 +418,13 @@ class TEx(ctk.CTk):
             self.editing_item_id = None
         
         self.abbrev_dict[source] = {
+            **options,
             'replacement': replacement,
             'ignored': False,
             'tag': self.current_tag,
             'original_encrypted': original_encrypted_to_preserve
         }
-        self.save_abbreviations()
+        self.save_abbreviation(source, renamed_from=original_source)
         self.apply_abbreviations()
         self.update_abbreviation_listbox()
         self.reset_ui()
@@ -412,7 +471,7 @@ class TEx(ctk.CTk):
             if not self.abbrev_dict[source].get('ignored', False) and self.abbrev_dict[source].get('tag') == self.current_tag:
                 self.text_expander.remove_abbreviation(source)
             del self.abbrev_dict[source]
-            self.save_abbreviations()
+            self.delete_abbreviations([source])
             self.update_abbreviation_listbox()
 
     def toggle_ignore_item(self, item_id):
@@ -426,7 +485,7 @@ class TEx(ctk.CTk):
 
         if source in self.abbrev_dict:
             self.abbrev_dict[source]['ignored'] = not self.abbrev_dict[source].get('ignored', False)
-            self.save_abbreviations()
+            self.save_abbreviation(source)
             self.apply_abbreviations()
             self.update_abbreviation_listbox()
 
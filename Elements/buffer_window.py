@@ -32,7 +32,7 @@ def show_buffer_window(self, icon=None, item=None):
         # Privacy text
         info_text = (
             "🔒 Your keyboard input is not shared.\n"
-            "It's stored only on your device in a local buffer of 50 characters to activate the expansion.\n"
+            "It's stored only on your device in a small local buffer, just long enough for your longest abbreviation.\n"
             "You can verify this in the source code:"
         )
 
@@ -62,7 +62,7 @@ def show_buffer_window(self, icon=None, item=None):
         # Update buffer every 500ms
         def update_buffer():
             if self.buffer_window and self.buffer_window.winfo_exists():
-                current = self.app.text_expander.buffer
+                current = str(self.app.text_expander.buffer)
                 self.buffer_text.configure(state="normal")
                 self.buffer_text.delete("1.0", "end")
                 self.buffer_text.insert("end", current)
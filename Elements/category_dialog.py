@@ -387,6 +387,8 @@ class CategoryManagerDialog:
         if dialog.result:
             self.refresh_list()
             self.app.refresh_sidebar()
+            # Encryption or app scope may have changed
+            self.app.refresh_abbreviations()
     
     def delete_category(self, category_id):
         """Delete a category"""
@@ -409,7 +411,7 @@ class CategoryManagerDialog:
                 del self.app.abbrev_dict[key]
             
             if self.category_manager.delete_category(category_id):
-                self.app.save_abbreviations()
+                self.app.delete_abbreviations(keys_to_delete)
                 self.app.apply_abbreviations()
                 
                 if self.app.current_tag == category_id:
@@ -0,0 +1,107 @@
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, Optional
+
+# PRAGMA user_version once Expansions.json has been imported
+_JSON_IMPORTED = 1
+
+
+class SnippetStore:
+    """Abbreviations kept in SQLite, one row per abbreviation.
+
+    Each row holds the abbreviation's record exactly as Expansions.json
+    stores it (replacement already encrypted for encrypted categories), so
+    saving an edit writes that one row instead of the whole collection, and
+    a crash mid-write can't leave a half-written file. Until the existing
+    JSON file has been imported, each start tries again; the import and the
+    mark that it finished are committed together.
+    """
+
+    def __init__(self, db_file="user/Expansions.db", json_file="user/Expansions.json"):
+        self.db_file = db_file
+        self.json_file = json_file
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS snippets (source TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.conn.commit()
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < _JSON_IMPORTED:
+            if os.path.exists(json_file):
+                count = self.import_json(json_file, version=_JSON_IMPORTED)
+                print(f"📦 Imported {count} abbreviations from {json_file}")
+            else:
+                self.put_many({}, version=_JSON_IMPORTED)
+
+    def data_version(self) -> int:
+        """Changes whenever another connection (another TEx, an import)
+        commits; our own writes leave it alone"""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self) -> Dict:
+        """Load every stored record"""
+        records = {}
+        for source, data in self.conn.execute("SELECT source, data FROM snippets"):
+            try:
+                records[source] = json.loads(data)
+            except json.JSONDecodeError:
+                print(f"⚠️  Skipping unreadable record for '{source}'")
+        return records
+
+    def put_many(self, records: Dict, removed: Iterable[str] = (),
+                 version: Optional[int] = None) -> bool:
+        """Insert or replace several records, and delete the ones in removed,
+        in one transaction; version, if given, is stored as user_version in
+        the same transaction"""
+        try:
+            with self.conn:
+                self.conn.executemany("DELETE FROM snippets WHERE source = ?",
+                                      [(source,) for source in removed])
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO snippets (source, data) VALUES (?, ?)",
+                    [(source, json.dumps(record, ensure_ascii=False))
+                     for source, record in records.items()])
+                if version is not None:
+                    self.conn.execute(f"PRAGMA user_version = {int(version)}")
+            return True
+        except sqlite3.Error as e:
+            print(f"Failed to save abbreviations: {e}")
+            return False
+
+    def delete_many(self, sources: Iterable[str]) -> bool:
+        """Remove several records in one transaction"""
+        try:
+            with self.conn:
+                self.conn.executemany("DELETE FROM snippets WHERE source = ?",
+                                      [(source,) for source in sources])
+            return True
+        except sqlite3.Error as e:
+            print(f"Failed to delete abbreviations: {e}")
+            return False
+
+    def import_json(self, path: str, version: Optional[int] = None) -> int:
+        """Add (or overwrite) the records of an Expansions.json file; returns how many"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error loading abbreviations: {e}")
+            return 0
+        if not isinstance(records, dict):
+            print(f"Error loading abbreviations: {path} does not hold a JSON object")
+            return 0
+        return len(records) if self.put_many(records, version=version) else 0
+
+    def export_json(self, path: str) -> bool:
+        """Write every record in the Expansions.json format"""
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.load(), f, ensure_ascii=False, indent=4)
+            return True
+        except IOError as e:
+            print(f"Failed to export abbreviations: {e}")
+            return False
+
+    def close(self):
+        self.conn.close()
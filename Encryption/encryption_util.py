@@ -4,6 +4,8 @@ from cryptography.fernet import Fernet, InvalidToken
 
 class EncryptionUtil:
     SERVICE_NAME = "TExApp"
+    # Fernet instances by key; building one parses and splits the key
+    _ciphers = {}
 
     @staticmethod
     def save_key_to_keyring(token_name: str, token: str):
@@ -20,10 +22,18 @@ class EncryptionUtil:
         """Generates a base64 Fernet key string."""
         return Fernet.generate_key().decode()
 
+    @staticmethod
+    def cipher(key: str) -> Fernet:
+        """Cached Fernet instance for a key string."""
+        f = EncryptionUtil._ciphers.get(key)
+        if f is None:
+            f = EncryptionUtil._ciphers[key] = Fernet(key.encode())
+        return f
+
     @staticmethod
     def encrypt_data(data: str, key: str) -> str:
         try:
-            f = Fernet(key.encode())
+            f = EncryptionUtil.cipher(key)
             return f.encrypt(data.encode()).decode()
         except Exception as e:
             print(f"[Encrypt Error] {e}")
@@ -32,7 +42,7 @@ class EncryptionUtil:
     @staticmethod
     def decrypt_data(data: str, key: str) -> str:
         try:
-            f = Fernet(key.encode())
+            f = EncryptionUtil.cipher(key)
             return f.decrypt(data.encode()).decode()
         except InvalidToken:
             print("❌ Invalid encryption key or corrupted data.")
@@ -1,8 +1,49 @@
-from pynput.keyboard import Key, Listener, Controller, KeyCode
+from pynput.keyboard import Key, Listener
 import threading
 import time
 import platform
 import os
+import importlib.util
+from collections import deque
+
+from Expander.key_buffer import KeyBuffer
+from Expander.matcher import (AbbreviationMatcher, AbbreviationTable, TableBuilder, DELIMITER,
+                              build_scoped)
+from Expander.worker import ExpansionWorker
+from Expander.timing import TimingProfiles
+from Expander.templates import TemplateContext, render
+from Expander.clipboard import WlClipboard
+from Expander.focus import X11FocusQuery, WindowsFocusQuery
+from Expander.injectors import (UINPUT_NAME, Injector, PynputInjector, UInputInjector,
+                                WtypeInjector, ClipboardInjector, load_capabilities)
+
+# The buffer always keeps at least this much context, and grows to fit the
+# longest abbreviation plus its trigger key.
+MIN_BUFFER_SIZE = 50
+
+# Replacements at least this long are pasted through the clipboard on
+# X11/Windows rather than typed one key at a time (see
+# benchmarks/paste_vs_type.py).
+PASTE_THRESHOLD = 200
+
+# How long injected keys may still echo back through pynput after an
+# expansion finishes before they are treated as real typing.
+ECHO_GRACE = 0.5
+
+# Word delimiters used until set_delimiters() is called
+DEFAULT_DELIMITERS = ' \n\t'
+
+# Characters typed by whitespace keys
+_KEY_CHARS = {Key.space: ' ', Key.enter: '\n', Key.tab: '\t'}
+
+# Keys pynput reports for characters sent by Controller.type()
+_ECHO_TOKENS = {**_KEY_CHARS, Key.backspace: '\b'}
+
+
+def _minimal_edit(typed, target):
+    """(backspaces, text) that turn `typed` into `target` without retyping their common prefix"""
+    keep = len(os.path.commonprefix((typed, target)))
+    return len(typed) - keep, target[keep:]
 
 
 def _detect_use_evdev():
@@ -10,30 +51,61 @@ def _detect_use_evdev():
         return False
     if not os.environ.get('WAYLAND_DISPLAY'):
         return False
-    try:
-        import evdev  # noqa: F401
-        return True
-    except ImportError:
-        return False
+    return importlib.util.find_spec('evdev') is not None
 
 
+# Decided at import, without touching user/; the rest of the capability
+# probe is cached on disk when TextExpander starts (see Expander/injectors.py)
 _USE_EVDEV = _detect_use_evdev()
 
 if _USE_EVDEV:
     import evdev
-    from evdev import ecodes as ec, categorize, KeyEvent as EvKeyEvent
-    import subprocess
+    from evdev import ecodes as ec
+    import struct
     import select as _select
+    from Expander.inotify import DirectoryWatch, IN_CREATE, IN_ATTRIB, IN_DELETE
+    from Expander import keymap
+    from Expander.focus import HyprlandFocusTracker
 
 
 if _USE_EVDEV:
+    # struct input_event without the timestamp, which we never look at
+    _INPUT_EVENT = struct.Struct(f'{struct.calcsize("ll")}xHHi')
+    _READ_SIZE = _INPUT_EVENT.size * 64
+    _TABLE_SIZE = ec.KEY_MAX + 1
+
+    # Values of _EvdevListener._KIND
+    _KEY_PLAIN, _KEY_SHIFT, _KEY_FLUSH, _KEY_ALTGR, _KEY_CAPS = 0, 1, 2, 3, 4
+
+    def _flat_table(mapping, default=None):
+        """Expand a {keycode: value} dict into a list indexed by keycode"""
+        table = [default] * _TABLE_SIZE
+        for code, value in mapping.items():
+            table[code] = value
+        return table
+
+    class _DeviceState:
+        """Shift, AltGr and dead-key state of one input device.
+
+        Caps Lock is not here: it is one state for the whole seat, kept by
+        the listener.
+        """
+
+        __slots__ = ('device', 'source', 'level', 'dead')
+
+        def __init__(self, device=None):
+            self.device = device
+            self.source = device.path if device else None
+            self.level = 0
+            self.dead = None
+
     class _EvdevListener:
         """Global keyboard listener for Linux/Wayland using evdev.
         Requires the user to be in the 'input' group:
           sudo usermod -a -G input $USER  (then log out and back in)
         """
 
-        # US QWERTY key code → character
+        # US QWERTY key code → character; only used when xkbcommon is missing
         _NORMAL = {
             ec.KEY_GRAVE: '`', ec.KEY_1: '1', ec.KEY_2: '2', ec.KEY_3: '3',
             ec.KEY_4: '4', ec.KEY_5: '5', ec.KEY_6: '6', ec.KEY_7: '7',
@@ -83,6 +155,7 @@ if _USE_EVDEV:
             ec.KEY_PAGEDOWN: Key.page_down,
             ec.KEY_ESC: Key.esc,
         }
+        _INPUT_DIR = '/dev/input'
         _SHIFT_CODES = {ec.KEY_LEFTSHIFT, ec.KEY_RIGHTSHIFT}
         _FLUSH_MODS = {
             ec.KEY_LEFTCTRL, ec.KEY_RIGHTCTRL,
@@ -90,115 +163,332 @@ if _USE_EVDEV:
             ec.KEY_LEFTMETA, ec.KEY_RIGHTMETA,
         }
 
-        def __init__(self, on_press):
+        # Flat keycode-indexed copies of the maps above for the hot path
+        _SPECIAL_TABLE = _flat_table(_SPECIAL)
+        _KIND = _flat_table({
+            **{code: _KEY_SHIFT for code in _SHIFT_CODES},
+            **{code: _KEY_FLUSH for code in _FLUSH_MODS},
+            ec.KEY_CAPSLOCK: _KEY_CAPS,
+        }, _KEY_PLAIN)
+
+        def __init__(self, on_press, on_char, tables):
             self._on_press = on_press
+            self._on_char = on_char
             self._thread = None
             self._stop_event = threading.Event()
-            self._shift = False
+            self._epoll = None
+            self._wake_fd = None
+            self._watch = None
+            self._by_fd = {}
+            self._keymap = self._compile_keymap(tables)
             self._devices = self._find_keyboards()
+            # keymap.CAPS while Caps Lock is on, on whichever keyboard it was pressed
+            self._caps = keymap.CAPS if any(self._caps_led(dev) for dev in self._devices) else 0
             if not self._devices:
                 print("⚠️  No accessible keyboard devices found.")
                 print("    Add your user to the 'input' group, then log out and back in:")
                 print("      sudo usermod -a -G input $USER")
 
+        def _compile_keymap(self, tables):
+            """(levels, kinds) for _process; kinds marks the layout's AltGr keys"""
+            kinds = list(self._KIND)
+            for code in tables.level3_codes:
+                kinds[code] = _KEY_ALTGR
+            levels = tuple(level + [None] * (_TABLE_SIZE - len(level)) for level in tables.levels)
+            return levels, kinds
+
+        def set_keymap(self, tables):
+            """Switch to new translation tables; called off the listener
+            thread, the old ones are replaced in a single assignment."""
+            self._keymap = self._compile_keymap(tables)
+
+        def caps_locked(self):
+            return bool(self._caps)
+
+        @staticmethod
+        def _caps_led(dev):
+            try:
+                return ec.LED_CAPSL in dev.leds()
+            except OSError:
+                return False
+
+        @staticmethod
+        def _open_keyboard(path):
+            """Open path if it is a keyboard we should listen to, else None"""
+            try:
+                dev = evdev.InputDevice(path)
+            except (PermissionError, OSError):
+                return None
+            try:
+                caps = dev.capabilities()
+                if dev.name != UINPUT_NAME and ec.EV_KEY in caps and ec.KEY_A in caps[ec.EV_KEY]:
+                    return dev
+            except OSError:
+                pass
+            dev.close()
+            return None
+
         def _find_keyboards(self):
             keyboards = []
             for path in evdev.list_devices():
-                try:
-                    dev = evdev.InputDevice(path)
-                    caps = dev.capabilities()
-                    if ec.EV_KEY in caps and ec.KEY_A in caps[ec.EV_KEY]:
-                        keyboards.append(dev)
-                except (PermissionError, OSError):
-                    pass
+                dev = self._open_keyboard(path)
+                if dev:
+                    keyboards.append(dev)
             return keyboards
 
         def start(self):
             self._stop_event.clear()
+            self._epoll = _select.epoll()
+            self._wake_fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            self._epoll.register(self._wake_fd, _select.EPOLLIN)
+            try:
+                self._watch = DirectoryWatch(self._INPUT_DIR)
+                self._epoll.register(self._watch.fd, _select.EPOLLIN)
+            except OSError as e:
+                self._watch = None
+                print(f"⚠️  Keyboard hotplug unavailable ({e})")
+            self._by_fd = {}
+            for dev in self._devices:
+                self._by_fd[dev.fd] = _DeviceState(dev)
+                self._epoll.register(dev.fd, _select.EPOLLIN)
             self._thread = threading.Thread(target=self._run, daemon=True)
             self._thread.start()
 
         def stop(self):
             self._stop_event.set()
             if self._thread:
+                os.eventfd_write(self._wake_fd, 1)
                 self._thread.join(timeout=1.0)
                 self._thread = None
+                self._epoll.close()
+                os.close(self._wake_fd)
+                if self._watch:
+                    self._watch.close()
+                    self._watch = None
+
+        def _add_device(self, path):
+            if any(d.path == path for d in self._devices):
+                return
+            dev = self._open_keyboard(path)
+            if dev is None:
+                return
+            self._devices.append(dev)
+            self._by_fd[dev.fd] = _DeviceState(dev)
+            self._epoll.register(dev.fd, _select.EPOLLIN)
+            print(f"⌨️  Keyboard connected: {dev.name}")
+
+        def _on_hotplug(self):
+            for mask, name in self._watch.read():
+                if not name.startswith('event'):
+                    continue
+                path = os.path.join(self._INPUT_DIR, name)
+                if mask & IN_DELETE:
+                    fd = next((d.fd for d in self._devices if d.path == path), None)
+                    if fd is not None:
+                        self._drop_device(fd)
+                elif mask & (IN_CREATE | IN_ATTRIB):
+                    # udev often fixes permissions after the node appears, so
+                    # a failed open on create is retried on the attrib change.
+                    self._add_device(path)
+
+        def _drop_device(self, fd):
+            state = self._by_fd.pop(fd, None)
+            if state is None:
+                return
+            dev = state.device
+            try:
+                self._epoll.unregister(fd)
+            except OSError:
+                pass
+            self._devices.remove(dev)
+            print(f"⌨️  Keyboard disconnected: {dev.name}")
+            try:
+                dev.close()
+            except OSError:
+                pass
 
         def _run(self):
+            # Blocks in epoll until a device has input or stop() signals the
+            # eventfd, so an idle listener never wakes up.
             while not self._stop_event.is_set():
-                fds = [d.fd for d in self._devices]
-                if not fds:
-                    time.sleep(0.1)
-                    continue
-                try:
-                    r, _, _ = _select.select(fds, [], [], 0.05)
-                except Exception:
-                    time.sleep(0.05)
-                    continue
-                for fd in r:
-                    dev = next((d for d in self._devices if d.fd == fd), None)
-                    if not dev:
+                for fd, mask in self._epoll.poll():
+                    if fd == self._wake_fd:
+                        break
+                    if self._watch and fd == self._watch.fd:
+                        self._on_hotplug()
+                        continue
+                    state = self._by_fd.get(fd)
+                    if state is None:
+                        continue
+                    if mask & (_select.EPOLLERR | _select.EPOLLHUP):
+                        self._drop_device(fd)
                         continue
                     try:
-                        for event in dev.read():
-                            if event.type == ec.EV_KEY:
-                                self._process(categorize(event))
+                        self._dispatch(os.read(fd, _READ_SIZE), state)
+                    except BlockingIOError:
+                        pass
+                    except OSError:
+                        self._drop_device(fd)
                     except Exception:
                         pass
 
-        def _process(self, kev):
-            code = kev.scancode
-            state = kev.keystate
-
-            if code in self._SHIFT_CODES:
-                self._shift = (state != EvKeyEvent.key_up)
+        def _dispatch(self, data, state):
+            """Decode a block of raw input_event structs read from one device"""
+            for type_, code, value in _INPUT_EVENT.iter_unpack(data):
+                if type_ == ec.EV_KEY:
+                    self._process(code, value, state)
+
+        def _process(self, code, value, state):
+            # value: 0 = release, 1 = press, 2 = autorepeat
+            levels, kinds = self._keymap
+            kind = kinds[code]
+            if kind == _KEY_SHIFT:
+                state.level = (state.level | keymap.SHIFT) if value else (state.level & ~keymap.SHIFT)
+                return
+            if kind == _KEY_ALTGR:
+                state.level = (state.level | keymap.ALTGR) if value else (state.level & ~keymap.ALTGR)
+                return
+            if kind == _KEY_CAPS:
+                if value == 1:
+                    self._caps ^= keymap.CAPS
                 return
 
             # Flush buffer on ctrl/alt/meta press
-            if code in self._FLUSH_MODS:
-                if state == EvKeyEvent.key_down:
-                    self._on_press(Key.ctrl)
+            if kind == _KEY_FLUSH:
+                if value == 1:
+                    self._on_press(Key.ctrl, source=state.source)
+                return
+
+            if value == 0:
                 return
 
-            if state == EvKeyEvent.key_up:
+            special = self._SPECIAL_TABLE[code]
+            if special is not None:
+                dead, state.dead = state.dead, None
+                if dead is not None and special == Key.space:
+                    self._on_char(dead.spacing, state.source)
+                else:
+                    self._on_press(special, source=state.source)
                 return
 
-            if code in self._SPECIAL:
-                self._on_press(self._SPECIAL[code])
+            char = levels[state.level | self._caps][code]
+            if char is None:
                 return
+            if state.dead is not None or char.__class__ is keymap.DeadKey:
+                self._compose(char, state)
+                return
+            self._on_char(char, state.source)
+
+        def _compose(self, char, state):
+            """Dead key handling; off the common path"""
+            dead, state.dead = state.dead, None
+            if char.__class__ is keymap.DeadKey:
+                if dead is not None:
+                    self._on_char(dead.spacing, state.source)
+                state.dead = char
+                return
+            for composed in dead.compose(char):
+                self._on_char(composed, state.source)
+
 
-            char_map = self._SHIFTED if self._shift else self._NORMAL
-            char = char_map.get(code)
-            if char:
-                self._on_press(KeyCode.from_char(char))
+class _InputState:
+    """Typed-text buffer and trie position of one input source"""
+
+    __slots__ = ('buffer', 'cursor')
+
+    def __init__(self, matcher):
+        self.buffer = KeyBuffer(MIN_BUFFER_SIZE)
+        self.cursor = matcher.cursor(self.buffer)
 
 
 class TextExpander:
-    def __init__(self):
-        self.abbreviations = {}
-        self.buffer = ""
-        self.buffer_size = 50
-        self.controller = Controller() if not _USE_EVDEV else None
+    def __init__(self, clipboard=None, injector=None):
+        self._matcher = AbbreviationMatcher()
+        self._builder = TableBuilder(self._matcher)
+        # One state per input source (evdev device path; None for pynput) so
+        # a scanner or macro pad can't break matching on the main keyboard.
+        self._inputs = {}
+        self._active = self._input(None)
         self.listener = None
         self.enabled = True
+        self.delimiters = frozenset(DEFAULT_DELIMITERS)
         self._listener_lock = threading.Lock()
         self._force_stop = False
-        self._uinput = None
+        self._input_lock = threading.Lock()
+        self._expanding = 0
+        self._pending = deque()
+        # Keys we injected that may come back through the listener; shared
+        # between the worker (which fills it) and the listener (which drains it)
+        self._echo = deque()
+        self._echo_deadline = 0.0
+        self._echo_lock = threading.Lock()
+        # Set once the listener has reported a key as injected: the platform
+        # flags our own keys, so there is nothing to match against
+        self._flags_injected = False
+        self._worker = ExpansionWorker(self._run_expansion)
+        self._worker.start()
+        self.timing = TimingProfiles()
+        self.capabilities = load_capabilities()
+        self._keys = injector or self._select_injector()
+        self._tables = None
         if _USE_EVDEV:
-            try:
-                self._uinput = evdev.UInput(
-                    {ec.EV_KEY: [ec.KEY_BACKSPACE, ec.KEY_LEFTCTRL, ec.KEY_V]},
-                    name='tex-expander'
-                )
-            except Exception as e:
-                print(f"⚠️  UInput unavailable ({e}); backspace will fall back to wtype")
+            self.reload_keymap()
+            # In-process clipboard owner (TkClipboard), else wl-copy if installed
+            if clipboard is None and self.capabilities['wl_copy'] and self.capabilities['wl_paste']:
+                clipboard = WlClipboard(self.capabilities['wl_copy'], self.capabilities['wl_paste'])
+        self._paste = (ClipboardInjector(clipboard, self._keys, self.timing)
+                       if clipboard is not None else None)
+        self._focus = None
+        if _USE_EVDEV and HyprlandFocusTracker.available():
+            self._focus = HyprlandFocusTracker(on_layout_change=self.reload_keymap,
+                                               on_focus_change=self._matcher.focus)
+            self._focus.start()
+        elif not _USE_EVDEV:
+            # Only read per expansion, for timing; app scopes need focus events
+            for query in (X11FocusQuery, WindowsFocusQuery):
+                if query.available():
+                    try:
+                        self._focus = query()
+                    except Exception as e:
+                        print(f"⚠️  Focused window unknown ({e}); using default timing")
+                    break
+
+    def _select_injector(self):
+        """Pick the key injection backend from the cached capability probe"""
+        if not _USE_EVDEV:
+            return PynputInjector()
+        wtype = WtypeInjector(self.capabilities['wtype']) if self.capabilities['wtype'] else None
+        uinput = None
+        if self.capabilities['uinput']:
+            uinput = UInputInjector.create(fallback=wtype, settle=self.timing.settle,
+                                           caps_locked=self._caps_locked)
+        if uinput is None and wtype is None:
+            print("❌ No way to inject keys: add yourself to the input group or install wtype")
+            return Injector()
+        if uinput is None:
+            print("⚠️  Typing through wtype")
+        elif wtype is None:
+            print("⚠️  'wtype' not found; characters outside the keyboard layout will be skipped."
+                  " Install it: sudo pacman -S wtype")
+        return uinput or wtype
+
+    def _caps_locked(self):
+        listener = self.listener
+        return listener is not None and hasattr(listener, 'caps_locked') and listener.caps_locked()
+
+    @property
+    def injector(self):
+        """Name of the active key injection backend"""
+        return self._keys.name
 
     def start_listening(self):
         with self._listener_lock:
             if self.listener is None and not self._force_stop:
                 try:
                     if _USE_EVDEV:
-                        candidate = _EvdevListener(on_press=self.on_key_press)
+                        candidate = _EvdevListener(on_press=self.on_key_press,
+                                                   on_char=self.on_char,
+                                                   tables=self._tables)
                         if candidate._devices:
                             self.listener = candidate
                         else:
@@ -220,172 +510,312 @@ class TextExpander:
             if self.listener:
                 try:
                     self.listener.stop()
+                    # pynput's stop() only signals; the evdev listener joins itself
+                    if (isinstance(self.listener, threading.Thread)
+                            and self.listener is not threading.current_thread()):
+                        self.listener.join(timeout=1.0)
                     self.listener = None
-                    time.sleep(0.1)
                 except Exception as e:
                     print(f"❌ Failed to stop listener: {e}")
+        self.timing.save()
 
-    def on_key_press(self, key):
+    def on_key_press(self, key, injected=False, source=None):
         if self._force_stop or not self.enabled:
             return
+        if injected:
+            if not self._flags_injected:
+                self._flags_injected = True
+                with self._echo_lock:
+                    self._echo.clear()
+            return
+        if self._is_echo(key):
+            return
+        with self._input_lock:
+            # Keys typed while an expansion is running are queued and fed to
+            # the matcher once it is done, so back-to-back abbreviations match.
+            if self._expanding:
+                self._pending.append((source, key))
+            else:
+                self._handle_key(key, source)
+
+    def on_char(self, char, source=None):
+        """Fast path for listeners that already decoded a printable character"""
+        if self._force_stop or not self.enabled:
+            return
+        with self._input_lock:
+            if self._expanding:
+                self._pending.append((source, char))
+            else:
+                self._feed(char, self._input(source))
+
+    def _input(self, source):
+        state = self._inputs.get(source)
+        if state is None:
+            state = self._inputs[source] = _InputState(self._matcher)
+        self._active = state
+        return state
+
+    @property
+    def buffer(self):
+        """Buffer of the most recently used input source"""
+        return self._active.buffer
+
+    def _is_echo(self, key):
+        """Recognise keys we injected ourselves on backends that don't flag them"""
+        if not self._echo:
+            return False
+        token = getattr(key, 'char', None) or _ECHO_TOKENS.get(key)
+        with self._echo_lock:
+            if time.monotonic() > self._echo_deadline:
+                self._echo.clear()
+                return False
+            if token is None:
+                return False
+            # Tolerate a few echoes the platform swallowed or reported differently
+            for i, expected in enumerate(self._echo):
+                if i == 8:
+                    break
+                if expected == token:
+                    for _ in range(i + 1):
+                        self._echo.popleft()
+                    return True
+        return False
+
+    def _handle_key(self, key, source=None):
+        state = self._input(source)
+        if type(key) is str:
+            # Replayed from on_char()
+            self._feed(key, state)
+            return
         try:
             if hasattr(key, 'char') and key.char is not None:
                 if key.char.isprintable():
-                    self.buffer += key.char
-            elif key in [Key.space, Key.enter, Key.tab, Key.delete, Key.left,
-                         Key.right, Key.up, Key.down, Key.home, Key.end,
-                         Key.page_up, Key.page_down, Key.esc, Key.ctrl,
-                         Key.shift, Key.alt, Key.alt_l, Key.alt_r, "\x01"]:
-                if key == Key.space:
-                    self.buffer += ' '
-                elif key == Key.enter:
-                    self.buffer += '\n'
-                elif key == Key.tab:
-                    self.buffer += '\t'
-                self.check_abbreviations()
+                    self._feed(key.char, state)
+            elif key in _KEY_CHARS:
+                self._feed(_KEY_CHARS[key], state)
             elif key == Key.backspace:
-                if self.buffer:
-                    self.buffer = ''
-            else:
-                pass
+                state.buffer.clear()
+                state.cursor.reset()
 
         except AttributeError:
             pass
 
-        if len(self.buffer) > self.buffer_size:
-            self.buffer = self.buffer[-self.buffer_size:]
-
-    def check_abbreviations(self):
+    def _feed(self, char, state):
+        """Run one typed character through the buffer and the matcher"""
+        if char in self.delimiters:
+            # The cursor reads the word back from the buffer, so the
+            # delimiter goes in after the word has been checked
+            self.check_abbreviations(char, state)
+            state.buffer.append(char)
+        elif char.isspace():
+            # Whitespace that isn't a delimiter ends the word without expanding
+            state.buffer.append(char)
+            state.cursor.reset()
+        else:
+            state.buffer.append(char)
+            match = state.cursor.feed(char)
+            if match:
+                state.buffer.clear()
+                self.expand_abbreviation(*match, trigger='')
+
+    def check_abbreviations(self, delimiter, state):
+        """A delimiter ended the word; expand it if it is an abbreviation"""
         if self._force_stop or not self.enabled:
             return
 
-        if not self.buffer.endswith(' '):
+        # Resizing only happens here, between words and under the input lock
+        buffer_size = max(MIN_BUFFER_SIZE, self._matcher.table.longest + 1)
+        if state.buffer.capacity != buffer_size:
+            state.buffer.resize(buffer_size)
+
+        match = state.cursor.end_word()
+        if match is None and self._matcher.table.patterns.rules:
+            match = self._matcher.table.match_pattern(self._last_word(state.buffer))
+        if match:
+            state.buffer.clear()
+            self.expand_abbreviation(*match, trigger=delimiter)
+
+    def _last_word(self, buffer):
+        """Text typed since the last delimiter or whitespace"""
+        text = str(buffer)
+        start = len(text)
+        while start and text[start - 1] not in self.delimiters and not text[start - 1].isspace():
+            start -= 1
+        return text[start:]
+
+    def expand_abbreviation(self, abbrev, replacement, trigger=' '):
+        """Queue an expansion; it runs on the worker thread, not the listener's.
+
+        `trigger` is the delimiter typed after the abbreviation (empty for
+        immediate triggers); it is erased and typed again after the
+        replacement.
+        """
+        if self._force_stop or not self.enabled:
             return
+        self._expanding += 1
+        self._worker.submit(abbrev, replacement, trigger)
 
-        words = self.buffer.strip().split()
-        if not words:
-            return
+    def set_delimiters(self, delimiters):
+        """Characters that end a word and trigger delimiter-mode abbreviations"""
+        self.delimiters = frozenset(delimiters)
 
-        last_word = words[-1]
-        for abbrev, replacement in self.abbreviations.items():
-            if last_word == abbrev:
-                self.expand_abbreviation(abbrev, replacement)
-                break
+    def _expansion_done(self):
+        with self._input_lock:
+            self._expanding -= 1
+            if not self._pending:
+                return
+            if self._force_stop or not self.enabled:
+                self._pending.clear()
+                return
+            # Replaying may start another expansion; whatever is left then
+            # waits for that one to finish.
+            while self._pending and not self._expanding:
+                source, key = self._pending.popleft()
+                self._handle_key(key, source)
 
-    def expand_abbreviation(self, abbrev, replacement):
-        if self._force_stop or not self.enabled:
-            return
+    def expansion_stats(self):
+        """Queue depth and timing of the expansion worker"""
+        return self._worker.stats()
 
-        if _USE_EVDEV:
-            self._expand_wayland(abbrev, replacement)
-        else:
-            self._expand_xorg(abbrev, replacement)
+    def _run_expansion(self, abbrev, replacement, trigger):
+        try:
+            if self._force_stop or not self.enabled:
+                return
+            self._expand(abbrev, replacement, trigger)
+        finally:
+            self._expansion_done()
+
+    def _read_clipboard(self):
+        """Current clipboard text for {clipboard}, or None without a clipboard"""
+        if self._paste is None:
+            return None
+        try:
+            return self._paste.clipboard.get()
+        except Exception as e:
+            print(f"⚠️  Could not read the clipboard ({e})")
+            return None
+
+    def _focused_app(self):
+        """Window class of the focused application, if known"""
+        return self._focus.window_class if self._focus is not None else None
+
+    def expansion_timing(self):
+        """Measured input latency per application, slowest first"""
+        return self.timing.stats()
 
     def _is_focused_xwayland(self):
         """Return True if the currently focused window is running under XWayland."""
-        try:
-            result = subprocess.run(
-                ['hyprctl', 'activewindow', '-j'],
-                capture_output=True, text=True, timeout=1
-            )
-            import json
-            return json.loads(result.stdout).get('xwayland', False)
-        except Exception:
+        return self._focus is not None and self._focus.xwayland
+
+    def _use_paste(self, text):
+        """Paste in XWayland apps (Discord, Tkinter), which can't take every
+        character from UInput; elsewhere only paste long replacements."""
+        if self._paste is None:
             return False
+        if _USE_EVDEV:
+            return self._is_focused_xwayland()
+        return len(text) >= PASTE_THRESHOLD
 
-    def _type_via_clipboard(self, text):
-        """Paste text via wl-copy + Ctrl+V — handles all Unicode in XWayland apps."""
-        try:
-            old = subprocess.run(
-                ['wl-paste', '-n'], capture_output=True, text=True, timeout=1
-            ).stdout
-        except Exception:
-            old = None
+    def _expand(self, abbrev, replacement, trigger=' '):
+        """Erase what differs from the replacement and deliver the rest.
 
-        try:
-            subprocess.run(['wl-copy', '--', text], timeout=1)
-            time.sleep(0.02)
-            if self._uinput:
-                self._uinput.write(ec.EV_KEY, ec.KEY_LEFTCTRL, 1)
-                self._uinput.write(ec.EV_KEY, ec.KEY_V, 1)
-                self._uinput.syn()
-                time.sleep(0.01)
-                self._uinput.write(ec.EV_KEY, ec.KEY_V, 0)
-                self._uinput.write(ec.EV_KEY, ec.KEY_LEFTCTRL, 0)
-                self._uinput.syn()
-                time.sleep(0.05)
-        finally:
-            if old is not None:
-                time.sleep(0.05)
-                try:
-                    subprocess.run(['wl-copy', '--', old], timeout=1)
-                except Exception:
-                    pass
-
-    def _expand_wayland(self, abbrev, replacement):
-        """Expand on Wayland.
-        Backspaces: UInput (kernel-level, reaches both XWayland and native Wayland).
-        Text: clipboard paste for XWayland (Discord, Tkinter), wtype for native Wayland.
+        Keys go through the selected injector, long or XWayland-bound text
+        through the clipboard. On Wayland our keys come from our own UInput
+        device, which the listener ignores; on X11/Windows they are dropped
+        through pynput's injected flag or by matching the expected echo.
         """
-        self.enabled = False
+        lefts = 0
+        if replacement.__class__ is not str:
+            # Placeholders are evaluated now, not when the table was built
+            replacement, lefts = render(replacement, TemplateContext(
+                clipboard=self._read_clipboard, lookup=self._matcher.table.plan))
+        count, text = _minimal_edit(abbrev + trigger, replacement + trigger)
+        if not count and not text and not lefts:
+            return
+        app = self._focused_app()
+        paste = bool(text) and self._use_paste(text)
+        echoes = self._keys.echoes and not self._flags_injected
+        if echoes:
+            with self._echo_lock:
+                self._echo_deadline = float('inf')
+                self._echo.extend('\b' * count)
+                self._echo.extend('v' if paste else text)
         try:
-            self.buffer = self.buffer[:-len(abbrev) + 1]
-            count = len(abbrev) + 1
-
-            if self._uinput:
-                for _ in range(count):
-                    self._uinput.write(ec.EV_KEY, ec.KEY_BACKSPACE, 1)
-                    self._uinput.write(ec.EV_KEY, ec.KEY_BACKSPACE, 0)
-                    self._uinput.syn()
-                time.sleep(0.04)
-            else:
-                args = ['wtype']
-                for _ in range(count):
-                    args.extend(['-k', 'BackSpace'])
-                subprocess.run(args, timeout=5)
-                time.sleep(0.04)
-
-            text = replacement + ' '
-            if self._is_focused_xwayland():
-                self._type_via_clipboard(text)
-            else:
-                subprocess.run(['wtype', '--', text], timeout=5)
-
-            self.buffer = ""
-        except FileNotFoundError:
-            print("❌ 'wtype' not found. Install it: sudo pacman -S wtype")
-        except Exception as e:
-            print(f"❌ Expansion error: {e}")
+            self._keys.backspace(count)
+            if paste:
+                try:
+                    self._paste.type(text, app)
+                    text = ''
+                except Exception as e:
+                    print(f"⚠️  Clipboard unavailable ({e}); typing instead")
+                    if echoes:
+                        with self._echo_lock:
+                            self._echo.extend(text)
+            if text:
+                self._keys.type(text, app)
+            if lefts:
+                # Back over the text after {cursor} and the retyped trigger
+                self._keys.cursor_left(lefts + len(trigger))
         finally:
-            self.enabled = True
+            if echoes:
+                with self._echo_lock:
+                    self._echo_deadline = time.monotonic() + ECHO_GRACE
 
-    def _expand_xorg(self, abbrev, replacement):
-        """Expand using pynput Controller — works on Windows / X11."""
-        was_enabled = self.enabled
-        if was_enabled:
-            self.stop_listening()
-        try:
-            self.buffer = self.buffer[:-len(abbrev) + 1]
-            for _ in range(len(abbrev) + 1):
-                self.controller.press(Key.backspace)
-                self.controller.release(Key.backspace)
-            self.controller.type(replacement + " ")
-            self.buffer = ""
-        finally:
-            if was_enabled:
-                self._force_stop = False
-                self.enabled = True
-                self.start_listening()
+    def clear_buffer(self):
+        for state in list(self._inputs.values()):
+            state.buffer.clear()
+            state.cursor.reset()
+
+    def reload_keymap(self):
+        """Re-read the keyboard layout after it changed (evdev only).
+
+        Recompiles the listener's decoding tables and the reverse map used to
+        type through UInput.
+        """
+        tables = keymap.load_tables(_EvdevListener._NORMAL, _EvdevListener._SHIFTED)
+        print(f"⌨️  Keyboard layout: {tables.name}")
+        if hasattr(self._keys, 'set_keymap'):
+            self._keys.set_keymap(tables)
+        self._tables = tables
+        listener = self.listener
+        if listener is not None and hasattr(listener, 'set_keymap'):
+            listener.set_keymap(tables)
+
+    @property
+    def abbreviations(self):
+        """The read-only abbreviation table active in the focused application"""
+        return self._matcher.table
+
+    def set_abbreviations(self, items):
+        """Compile (abbrev, replacement[, trigger[, propagate_case[, regex[, apps[,
+        exclude_apps]]]]]) tuples into tables and publish them.
+
+        Items with apps only expand in those applications, items with
+        exclude_apps everywhere else; apps are matched by window class. The
+        items are read on the calling thread and the tables built on a
+        background one; the listener only ever sees the finished ones,
+        swapped in with one assignment.
+        """
+        items = list(items)
+        self._builder.submit(lambda table, scoped: build_scoped(items), replaces=True)
 
-    def add_abbreviation(self, abbrev, replacement):
-        self.abbreviations[abbrev] = replacement
+    def add_abbreviation(self, abbrev, replacement, trigger=DELIMITER, propagate_case=False,
+                         regex=False):
+        """Add abbrev to every application scope"""
+        item = [(abbrev, replacement, trigger, propagate_case, regex)]
+        self._builder.submit(lambda table, scoped: (
+            table.derive(item), {app: t.derive(item) for app, t in scoped.items()}))
 
     def remove_abbreviation(self, abbrev):
-        if abbrev in self.abbreviations:
-            del self.abbreviations[abbrev]
+        self._builder.submit(lambda table, scoped: (
+            table.without(abbrev), {app: t.without(abbrev) for app, t in scoped.items()}))
 
     def clear_abbreviations(self):
-        self.abbreviations.clear()
+        self._builder.submit(lambda table, scoped: (AbbreviationTable(), None), replaces=True)
+
+    def wait_for_abbreviations(self, timeout=None):
+        """Block until queued abbreviation changes are published"""
+        return self._builder.wait(timeout)
 
     def set_enabled(self, enabled):
         print(f"🔧 Setting expansion enabled: {enabled}")
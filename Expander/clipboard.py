@@ -0,0 +1,154 @@
+"""Clipboard owners used for paste-based expansion"""
+import subprocess
+import threading
+import time
+import tkinter as tk
+
+
+class TkClipboard:
+    """Serves the CLIPBOARD selection straight from TEx's own Tk root.
+
+    Tk runs as an X11 client (under XWayland on Wayland), so the snippet is
+    handed to the target application by our own process: no wl-copy or
+    wl-paste per expansion. Because we see the target's request, we know
+    exactly when the snippet has been consumed and can restore the previous
+    content right after, instead of guessing with sleeps.
+
+    Other windowing systems (Windows) go through Tk's regular clipboard
+    commands; there `observable` is False and fetches can't be waited for.
+
+    Methods may be called from any thread; Tk work is marshalled onto the
+    Tk main loop.
+    """
+
+    def __init__(self, root):
+        self._root = root
+        self.observable = root.tk.call('tk', 'windowingsystem') == 'x11'
+        self._text = ''
+        self._owned = False
+        self._registered = False
+        self._served = threading.Event()
+        self._served_at = 0.0
+        # Fetches only count once the paste chord is about to be sent;
+        # clipboard managers fetch on every ownership change before that
+        self._armed = False
+
+    def _call(self, func, timeout=1.0):
+        if threading.current_thread() is threading.main_thread():
+            return func()
+        done = threading.Event()
+        result = {}
+
+        def run():
+            try:
+                result['value'] = func()
+            except Exception as e:
+                result['error'] = e
+            finally:
+                done.set()
+
+        self._root.after(0, run)
+        if not done.wait(timeout):
+            raise TimeoutError("Tk main loop did not respond")
+        if 'error' in result:
+            raise result['error']
+        return result.get('value')
+
+    def _serve(self, offset, length):
+        offset, length = int(offset), int(length)
+        if self._armed and offset + length >= len(self._text) and not self._served.is_set():
+            self._served_at = time.perf_counter()
+            self._served.set()
+        return self._text[offset:offset + length]
+
+    def _lost(self):
+        self._owned = False
+
+    def _own(self):
+        if not self._registered:
+            self._root.selection_handle(self._serve, selection='CLIPBOARD')
+            self._registered = True
+        self._root.selection_own(selection='CLIPBOARD', command=self._lost)
+        self._owned = True
+
+    def _replace(self, text):
+        self._root.clipboard_clear()
+        self._root.clipboard_append(text)
+
+    def get(self):
+        """Current clipboard text, or None if it is empty or not text"""
+        def read():
+            try:
+                return self._root.clipboard_get()
+            except tk.TclError:
+                return None
+        try:
+            return self._call(read)
+        except Exception:
+            return None
+
+    def offer(self, text):
+        """Take ownership of the clipboard with text as its content"""
+        self._text = text
+        self._armed = False
+        self._served.clear()
+        if self.observable:
+            self._call(self._own)
+        else:
+            self._call(lambda: self._replace(text))
+
+    def arm(self):
+        """Start watching for the target's fetch; call right before Ctrl+V"""
+        self._served.clear()
+        self._armed = True
+
+    def wait_served(self, timeout):
+        """perf_counter() time at which the target fetched the snippet after
+        arm(), or None on timeout"""
+        if not self._served.wait(timeout):
+            return None
+        return self._served_at
+
+    def restore(self, text):
+        """Put previous content back, unless someone else copied meanwhile"""
+        if self.observable:
+            if self._owned:
+                self._text = text
+        elif self.get() == self._text:
+            self._call(lambda: self._replace(text))
+
+
+class WlClipboard:
+    """Fallback through wl-copy / wl-paste when there is no Tk root.
+
+    Every call forks a process and fetches can't be observed, so this is
+    only used when TkClipboard is not available.
+    """
+
+    observable = False
+
+    def __init__(self, wl_copy='wl-copy', wl_paste='wl-paste'):
+        self._copy = wl_copy
+        self._paste = wl_paste
+
+    def get(self):
+        try:
+            return subprocess.run([self._paste, '-n'], capture_output=True,
+                                  text=True, timeout=1).stdout
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    def offer(self, text):
+        subprocess.run([self._copy, '--', text], timeout=1)
+
+    def arm(self):
+        pass
+
+    def wait_served(self, timeout):
+        return None
+
+    def restore(self, text):
+        try:
+            subprocess.run([self._copy, '--', text], timeout=1)
+        except (OSError, subprocess.SubprocessError):
+            pass
@@ -0,0 +1,197 @@
+"""Focused-window tracking: Hyprland's IPC sockets, or a direct query on X11/Windows"""
+import importlib.util
+import json
+import os
+import platform
+import socket
+import threading
+
+
+def hyprland_socket_dir():
+    """Directory holding Hyprland's IPC sockets, or None outside Hyprland"""
+    signature = os.environ.get('HYPRLAND_INSTANCE_SIGNATURE')
+    if not signature:
+        return None
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(os.path.join(runtime, 'hypr', signature)):
+        return os.path.join(runtime, 'hypr', signature)
+    # Hyprland before 0.40 kept its sockets in /tmp
+    return os.path.join('/tmp', 'hypr', signature)
+
+
+def hyprland_request(command, socket_dir=None, timeout=1.0):
+    """Send one command to Hyprland's request socket (what hyprctl does) and return the reply"""
+    socket_dir = socket_dir or hyprland_socket_dir()
+    if not socket_dir:
+        raise OSError("not running under Hyprland")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(os.path.join(socket_dir, '.socket.sock'))
+        sock.sendall(command.encode())
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b''.join(chunks).decode(errors='replace')
+
+
+class HyprlandFocusTracker:
+    """Keeps the focused window's class and XWayland flag cached in memory.
+
+    A background thread subscribes once to Hyprland's event socket and
+    refreshes the cache on focus changes, so the expansion path reads an
+    attribute instead of spawning hyprctl. `on_focus_change` is called with
+    the new window class whenever it changes. `socket_dir` can point at a
+    directory with fake `.socket.sock` / `.socket2.sock` servers.
+    """
+
+    RECONNECT_DELAY = 2.0
+
+    def __init__(self, socket_dir=None, on_layout_change=None, on_focus_change=None):
+        self.socket_dir = socket_dir or hyprland_socket_dir()
+        self.on_layout_change = on_layout_change
+        self.on_focus_change = on_focus_change
+        self.window_class = None
+        self.xwayland = False
+        self._sock = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def available():
+        return hyprland_socket_dir() is not None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def refresh(self):
+        """Query the focused window directly; used at connect and on focus events"""
+        try:
+            window = json.loads(hyprland_request('j/activewindow', self.socket_dir) or '{}')
+        except (OSError, ValueError):
+            return
+        self._set_class(window.get('class') or None)
+        self.xwayland = bool(window.get('xwayland', False))
+
+    def _set_class(self, window_class):
+        if window_class == self.window_class:
+            return
+        self.window_class = window_class
+        if self.on_focus_change:
+            self.on_focus_change(window_class)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(os.path.join(self.socket_dir, '.socket2.sock'))
+                    self._sock = sock
+                    self.refresh()
+                    self._listen(sock)
+            except OSError:
+                pass
+            finally:
+                self._sock = None
+            if not self._stop_event.wait(self.RECONNECT_DELAY):
+                print("⚠️  Lost Hyprland event socket, reconnecting")
+
+    def _listen(self, sock):
+        pending = b''
+        while not self._stop_event.is_set():
+            chunk = sock.recv(4096)
+            if not chunk:
+                return
+            *lines, pending = (pending + chunk).split(b'\n')
+            for line in lines:
+                event, _, data = line.decode(errors='replace').partition('>>')
+                self._handle(event, data)
+
+    def _handle(self, event, data):
+        if event == 'activewindow':
+            # "class,title"; the XWayland flag needs a query of its own
+            self._set_class(data.split(',', 1)[0] or None)
+        elif event == 'activewindowv2':
+            self.refresh()
+        elif event == 'activelayout' and self.on_layout_change:
+            self.on_layout_change()
+
+
+class X11FocusQuery:
+    """Window class of the focused X11 window, asked each time it is read.
+
+    Uses python-xlib, which pynput's X11 backend already depends on, over a
+    connection of its own. It is read once per expansion, on the worker
+    thread, never per keystroke.
+    """
+
+    xwayland = False
+
+    def __init__(self):
+        from Xlib import X, display
+        self._any_type = X.AnyPropertyType
+        self._display = display.Display()
+        self._root = self._display.screen().root
+        self._active = self._display.intern_atom('_NET_ACTIVE_WINDOW')
+
+    @staticmethod
+    def available():
+        return (platform.system() == 'Linux' and bool(os.environ.get('DISPLAY'))
+                and importlib.util.find_spec('Xlib') is not None)
+
+    @property
+    def window_class(self):
+        try:
+            prop = self._root.get_full_property(self._active, self._any_type)
+            if not prop or not prop.value or not prop.value[0]:
+                return None
+            window = self._display.create_resource_object('window', prop.value[0])
+            wm_class = window.get_wm_class()
+            return wm_class[1] if wm_class else None
+        except Exception:
+            return None
+
+
+class WindowsFocusQuery:
+    """Executable name (without .exe) of the foreground window's process"""
+
+    xwayland = False
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+        self._ctypes = ctypes
+        self._user32 = ctypes.windll.user32
+        self._pid = wintypes.DWORD()
+
+    @staticmethod
+    def available():
+        return platform.system() == 'Windows'
+
+    @property
+    def window_class(self):
+        import psutil
+        hwnd = self._user32.GetForegroundWindow()
+        if not hwnd:
+            return None
+        self._user32.GetWindowThreadProcessId(hwnd, self._ctypes.byref(self._pid))
+        try:
+            name = psutil.Process(self._pid.value).name()
+        except (psutil.Error, ValueError):
+            return None
+        return name[:-4] if name.lower().endswith('.exe') else name
@@ -0,0 +1,333 @@
+"""Backends that deliver expansions to the focused application"""
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+
+try:
+    import evdev
+    from evdev import ecodes as ec
+except ImportError:
+    evdev = None
+
+from Expander import keymap
+
+CAPABILITIES_FILE = "user/Capabilities.json"
+
+# Name of the virtual keyboard used for injection; the evdev listener skips it
+# so our own keystrokes never reach the matcher.
+UINPUT_NAME = 'tex-expander'
+
+# Keystrokes written per UInput SYN frame. Modifier changes ride along in
+# the same frame; a frame is the unit the compositor reads at once.
+UINPUT_KEYS_PER_FRAME = 8
+
+_TOOLS = {'wtype': 'wtype', 'wl_copy': 'wl-copy', 'wl_paste': 'wl-paste'}
+
+
+def _fingerprint():
+    """What the cached probe depends on; any change triggers a new probe"""
+    return [platform.system(), bool(os.environ.get('WAYLAND_DISPLAY')),
+            os.environ.get('PATH', '')]
+
+
+def probe_capabilities():
+    """Find out which injection backends this system supports"""
+    capabilities = {
+        'fingerprint': _fingerprint(),
+        'evdev': importlib.util.find_spec('evdev') is not None,
+        'uinput': os.access('/dev/uinput', os.W_OK),
+    }
+    for key, tool in _TOOLS.items():
+        capabilities[key] = shutil.which(tool)
+    return capabilities
+
+
+def load_capabilities(path=CAPABILITIES_FILE):
+    """Cached probe results, probing again if the environment changed.
+
+    Only the tool lookups are cached; each is trusted while the binary is
+    still there, and a missing one is looked up again, so installing wtype
+    takes effect on the next start. Those are stats, not processes. The
+    uinput permission and the evdev import are cheap enough to check every
+    time, so joining the input group is picked up too.
+    """
+    cached = None
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            cached = None
+    if isinstance(cached, dict) and cached.get('fingerprint') == _fingerprint():
+        capabilities = dict(cached)
+        for key, tool in _TOOLS.items():
+            found = capabilities.get(key)
+            if not found or not os.path.exists(found):
+                capabilities[key] = shutil.which(tool)
+        capabilities['evdev'] = importlib.util.find_spec('evdev') is not None
+        capabilities['uinput'] = os.access('/dev/uinput', os.W_OK)
+    else:
+        capabilities = probe_capabilities()
+    if capabilities == cached:
+        return capabilities
+
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(capabilities, f, ensure_ascii=False, indent=4)
+    except IOError as e:
+        print(f"Failed to save capabilities: {e}")
+    return capabilities
+
+
+class Injector:
+    """Delivers keystrokes to the focused application.
+
+    The base class is the null backend: it accepts everything and delivers
+    nothing.
+    """
+
+    name = 'none'
+    # True if our own keys reach the listener and must be filtered as echoes
+    echoes = False
+
+    def backspace(self, count):
+        pass
+
+    def type(self, text, app=None):
+        pass
+
+    def paste_chord(self):
+        """Press Ctrl+V"""
+        pass
+
+    def cursor_left(self, count):
+        """Move the text cursor count characters to the left"""
+        pass
+
+    def close(self):
+        pass
+
+
+class RecordingInjector(Injector):
+    """Records what would have been injected, for tests and dry runs"""
+
+    name = 'recording'
+
+    def __init__(self):
+        self.calls = []
+
+    def backspace(self, count):
+        self.calls.append(('backspace', count))
+
+    def type(self, text, app=None):
+        self.calls.append(('type', text))
+
+    def paste_chord(self):
+        self.calls.append(('paste',))
+
+    def cursor_left(self, count):
+        self.calls.append(('left', count))
+
+
+class PynputInjector(Injector):
+    """pynput Controller — Windows and X11"""
+
+    name = 'pynput'
+    echoes = True
+
+    def __init__(self, controller=None):
+        from pynput.keyboard import Controller, Key
+        self._key = Key
+        self.controller = controller or Controller()
+
+    def backspace(self, count):
+        for _ in range(count):
+            self.controller.press(self._key.backspace)
+            self.controller.release(self._key.backspace)
+
+    def cursor_left(self, count):
+        for _ in range(count):
+            self.controller.press(self._key.left)
+            self.controller.release(self._key.left)
+
+    def type(self, text, app=None):
+        self.controller.type(text)
+
+    def paste_chord(self):
+        with self.controller.pressed(self._key.ctrl):
+            self.controller.press('v')
+            self.controller.release('v')
+
+
+class WtypeInjector(Injector):
+    """wtype subprocesses through the Wayland virtual keyboard protocol"""
+
+    name = 'wtype'
+
+    def __init__(self, path='wtype'):
+        self.path = path
+
+    def backspace(self, count):
+        if count:
+            subprocess.run([self.path] + ['-k', 'BackSpace'] * count, timeout=5)
+
+    def cursor_left(self, count):
+        if count:
+            subprocess.run([self.path] + ['-k', 'Left'] * count, timeout=5)
+
+    def type(self, text, app=None):
+        subprocess.run([self.path, '--', text], timeout=5)
+
+    def paste_chord(self):
+        subprocess.run([self.path, '-M', 'ctrl', '-k', 'v', '-m', 'ctrl'], timeout=5)
+
+
+class UInputInjector(Injector):
+    """Kernel-level virtual keyboard; reaches XWayland and native Wayland alike.
+
+    Text is typed through the reverse of the active keymap. Characters the
+    layout can't produce are handed to `fallback` (wtype), after letting the
+    kernel events drain; without a fallback they are skipped.
+    """
+
+    name = 'uinput'
+
+    def __init__(self, device, fallback=None, settle=None, caps_locked=None):
+        self.device = device
+        self.fallback = fallback
+        self._settle = settle or (lambda app: 0.0)
+        self._caps_locked = caps_locked or (lambda: False)
+        self._char_keys = ({}, {})
+        # Events written since the fallback last ran, which it must not overtake
+        self._unsettled = False
+
+    @classmethod
+    def create(cls, **kwargs):
+        """Open the virtual keyboard, or return None if that isn't possible"""
+        try:
+            device = evdev.UInput({ec.EV_KEY: list(range(1, keymap.TABLE_SIZE))},
+                                  name=UINPUT_NAME)
+        except Exception as e:
+            print(f"⚠️  UInput unavailable ({e})")
+            return None
+        return cls(device, **kwargs)
+
+    def set_keymap(self, tables):
+        """char -> (keycode, modifier keycodes), for Caps Lock off and on"""
+        if ec.KEY_RIGHTALT in tables.level3_codes:
+            altgr = ec.KEY_RIGHTALT
+        else:
+            altgr = min(tables.level3_codes, default=None)
+        maps = []
+        for caps in (0, keymap.CAPS):
+            char_keys = {' ': (ec.KEY_SPACE, ()), '\n': (ec.KEY_ENTER, ()), '\t': (ec.KEY_TAB, ())}
+            for level in (0, keymap.SHIFT, keymap.ALTGR, keymap.SHIFT | keymap.ALTGR):
+                if level & keymap.ALTGR and altgr is None:
+                    continue
+                mods = (((ec.KEY_LEFTSHIFT,) if level & keymap.SHIFT else ())
+                        + ((altgr,) if level & keymap.ALTGR else ()))
+                for code, char in enumerate(tables.levels[caps | level]):
+                    if char is not None and char.__class__ is not keymap.DeadKey:
+                        char_keys.setdefault(char, (code, mods))
+            maps.append(char_keys)
+        self._char_keys = tuple(maps)
+
+    def send(self, strokes):
+        """Write (keycode, modifiers) strokes, batching several per SYN frame"""
+        write = self.device.write
+        held = ()
+        in_frame = 0
+        for code, mods in strokes:
+            if mods != held:
+                for mod in held:
+                    if mod not in mods:
+                        write(ec.EV_KEY, mod, 0)
+                for mod in mods:
+                    if mod not in held:
+                        write(ec.EV_KEY, mod, 1)
+                held = mods
+            write(ec.EV_KEY, code, 1)
+            write(ec.EV_KEY, code, 0)
+            in_frame += 1
+            if in_frame == UINPUT_KEYS_PER_FRAME:
+                self.device.syn()
+                in_frame = 0
+        for mod in held:
+            write(ec.EV_KEY, mod, 0)
+        self.device.syn()
+        self._unsettled = True
+
+    def backspace(self, count):
+        if count:
+            self.send([(ec.KEY_BACKSPACE, ())] * count)
+
+    def cursor_left(self, count):
+        if count:
+            self.send([(ec.KEY_LEFT, ())] * count)
+
+    def type(self, text, app=None):
+        char_keys = self._char_keys[1 if self._caps_locked() else 0]
+        runs = []
+        for char in text:
+            stroke = char_keys.get(char)
+            typable = stroke is not None
+            if not runs or runs[-1][0] != typable:
+                runs.append((typable, []))
+            runs[-1][1].append(stroke if typable else char)
+
+        for i, (typable, run) in enumerate(runs):
+            if typable:
+                self.send(run)
+            elif self.fallback is not None:
+                # Let the kernel events (including the backspaces sent before
+                # this call) drain, or wtype's text can land ahead of them
+                if self._unsettled:
+                    time.sleep(self._settle(app))
+                    self._unsettled = False
+                self.fallback.type(''.join(run), app)
+
+    def paste_chord(self):
+        self.send([(ec.KEY_V, (ec.KEY_LEFTCTRL,))])
+
+    def close(self):
+        self.device.close()
+
+
+class ClipboardInjector(Injector):
+    """Pastes text: offer it on the clipboard, press Ctrl+V through `keys`,
+    then restore the previous content.
+
+    With an observable clipboard the restore happens as soon as the target
+    has fetched the snippet, and that delay calibrates `timing`.
+    """
+
+    name = 'clipboard'
+
+    def __init__(self, clipboard, keys, timing):
+        self.clipboard = clipboard
+        self.keys = keys
+        self.timing = timing
+
+    def type(self, text, app=None):
+        old = self.clipboard.get()
+        self.clipboard.offer(text)
+        try:
+            # Let the app catch up with the keys queued ahead of the paste
+            time.sleep(self.timing.settle(app))
+            self.clipboard.arm()
+            sent = time.perf_counter()
+            self.keys.paste_chord()
+            if not self.clipboard.observable:
+                time.sleep(self.timing.paste_wait(app))
+                return
+            served = self.clipboard.wait_served(self.timing.paste_timeout(app))
+            if served is None:
+                print("⚠️  Paste target never requested the clipboard")
+            self.timing.record(app, None if served is None else served - sent)
+        finally:
+            if old is not None:
+                self.clipboard.restore(old)
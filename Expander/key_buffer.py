@@ -0,0 +1,66 @@
+"""Fixed-capacity keystroke buffer"""
+
+
+class KeyBuffer:
+    """Ring buffer holding the last `capacity` typed characters.
+
+    Slots are preallocated, so appending a key never builds a new string;
+    text is only materialised when a caller asks for a tail of it.
+    """
+
+    __slots__ = ('_chars', '_capacity', '_end', '_size')
+
+    def __init__(self, capacity=50):
+        self._capacity = max(1, capacity)
+        self._chars = [''] * self._capacity
+        self._end = 0
+        self._size = 0
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def __len__(self):
+        return self._size
+
+    def __str__(self):
+        return self.tail(self._size)
+
+    def __bool__(self):
+        return self._size > 0
+
+    def append(self, char):
+        self._chars[self._end] = char
+        self._end += 1
+        if self._end == self._capacity:
+            self._end = 0
+        if self._size < self._capacity:
+            self._size += 1
+
+    def clear(self):
+        self._end = 0
+        self._size = 0
+
+    def tail(self, n):
+        """Return the last n characters as a string"""
+        n = min(n, self._size)
+        if n <= 0:
+            return ''
+        start = self._end - n
+        if start >= 0:
+            return ''.join(self._chars[start:self._end])
+        return ''.join(self._chars[start:]) + ''.join(self._chars[:self._end])
+
+    def endswith(self, suffix):
+        return self.tail(len(suffix)) == suffix
+
+    def resize(self, capacity):
+        """Change the capacity, keeping as much of the recent text as fits"""
+        capacity = max(1, capacity)
+        if capacity == self._capacity:
+            return
+        kept = self.tail(capacity)
+        self._capacity = capacity
+        self._chars = list(kept) + [''] * (capacity - len(kept))
+        self._size = len(kept)
+        self._end = self._size % capacity
@@ -0,0 +1,273 @@
+"""Keycode to character tables compiled from the active XKB keymap"""
+import ctypes
+import ctypes.util
+import json
+import os
+import re
+import shutil
+import subprocess
+import unicodedata
+
+from Expander.focus import hyprland_request
+
+# Evdev keycodes covered by the tables (everything a keyboard can send)
+TABLE_SIZE = 256
+
+# Index into KeymapTables.levels
+SHIFT, CAPS, ALTGR = 1, 2, 4
+
+# XKB keycodes are evdev keycodes shifted by 8
+_XKB_OFFSET = 8
+_XKB_MOD_INVALID = 0xFFFFFFFF
+
+# System keyboard configuration read when the compositor can't be asked
+_XORG_KEYBOARD_CONF = '/etc/X11/xorg.conf.d/00-keyboard.conf'
+_DEBIAN_KEYBOARD_CONF = '/etc/default/keyboard'
+
+_DEAD_KEYS = {
+    'dead_grave': ('̀', '`'),
+    'dead_acute': ('́', '´'),
+    'dead_circumflex': ('̂', '^'),
+    'dead_tilde': ('̃', '~'),
+    'dead_macron': ('̄', '¯'),
+    'dead_breve': ('̆', '˘'),
+    'dead_abovedot': ('̇', '˙'),
+    'dead_diaeresis': ('̈', '¨'),
+    'dead_abovering': ('̊', '˚'),
+    'dead_doubleacute': ('̋', '˝'),
+    'dead_caron': ('̌', 'ˇ'),
+    'dead_cedilla': ('̧', '¸'),
+    'dead_ogonek': ('̨', '˛'),
+}
+
+
+class DeadKey(str):
+    """Table entry for a dead key; the value is its combining mark"""
+
+    def __new__(cls, combining, spacing):
+        self = super().__new__(cls, combining)
+        self.spacing = spacing
+        return self
+
+    def compose(self, char):
+        """Combine with the next typed character, the way XKB compose would"""
+        if char == ' ':
+            return self.spacing
+        combined = unicodedata.normalize('NFC', char + self)
+        return combined if len(combined) == 1 else self.spacing + char
+
+
+class KeymapTables:
+    """Per-modifier-level arrays mapping evdev keycodes to characters.
+
+    `levels[level][code]` is a str, a DeadKey or None, where level is any
+    combination of SHIFT, CAPS and ALTGR, so translating a key event is a
+    single indexed lookup.
+    """
+
+    __slots__ = ('name', 'levels', 'level3_codes')
+
+    def __init__(self, name, levels, level3_codes=()):
+        self.name = name
+        self.levels = levels
+        self.level3_codes = frozenset(level3_codes)
+
+
+def us_tables(normal, shifted):
+    """Fallback tables built from the hard-coded US QWERTY maps"""
+    base = [None] * TABLE_SIZE
+    upper = [None] * TABLE_SIZE
+    for code, char in normal.items():
+        base[code] = char
+    for code, char in shifted.items():
+        upper[code] = char
+    caps = [c.upper() if c and c.isalpha() else c for c in base]
+    caps_shift = [c.lower() if c and c.isalpha() else c for c in upper]
+    levels = (base, upper, caps, caps_shift)
+    return KeymapTables('us (built-in)', levels + levels)
+
+
+def _load_xkbcommon():
+    path = ctypes.util.find_library('xkbcommon')
+    if not path:
+        return None
+    try:
+        lib = ctypes.CDLL(path)
+    except OSError:
+        return None
+    vp, u32 = ctypes.c_void_p, ctypes.c_uint32
+    lib.xkb_context_new.restype = vp
+    lib.xkb_context_new.argtypes = [ctypes.c_int]
+    lib.xkb_context_unref.argtypes = [vp]
+    lib.xkb_keymap_new_from_names.restype = vp
+    lib.xkb_keymap_new_from_names.argtypes = [vp, ctypes.POINTER(_RuleNames), ctypes.c_int]
+    lib.xkb_keymap_unref.argtypes = [vp]
+    lib.xkb_keymap_mod_get_index.restype = u32
+    lib.xkb_keymap_mod_get_index.argtypes = [vp, ctypes.c_char_p]
+    lib.xkb_state_new.restype = vp
+    lib.xkb_state_new.argtypes = [vp]
+    lib.xkb_state_unref.argtypes = [vp]
+    lib.xkb_state_update_mask.argtypes = [vp, u32, u32, u32, u32, u32, u32]
+    lib.xkb_state_key_get_one_sym.restype = u32
+    lib.xkb_state_key_get_one_sym.argtypes = [vp, u32]
+    lib.xkb_state_key_get_utf32.restype = u32
+    lib.xkb_state_key_get_utf32.argtypes = [vp, u32]
+    lib.xkb_keysym_get_name.argtypes = [u32, ctypes.c_char_p, ctypes.c_size_t]
+    return lib
+
+
+class _RuleNames(ctypes.Structure):
+    _fields_ = [(field, ctypes.c_char_p)
+                for field in ('rules', 'model', 'layout', 'variant', 'options')]
+
+
+_xkb = None
+
+
+def _hyprland_layout():
+    """RMLVO names and active group of Hyprland's main keyboard, or None"""
+    if not os.environ.get('HYPRLAND_INSTANCE_SIGNATURE'):
+        return None
+    try:
+        keyboards = json.loads(hyprland_request('j/devices')).get('keyboards', [])
+    except (OSError, ValueError):
+        return None
+    keyboard = next((k for k in keyboards if k.get('main')), keyboards[0] if keyboards else None)
+    if not keyboard:
+        return None
+    names = {field: keyboard.get(field) or None for field in ('layout', 'variant', 'options')}
+    return names, keyboard.get('active_layout_index', 0)
+
+
+def _localectl_layout():
+    """RMLVO names systemd-localed has for X11, or None"""
+    localectl = shutil.which('localectl')
+    if not localectl:
+        return None
+    try:
+        output = subprocess.run([localectl, 'status'], capture_output=True,
+                                text=True, timeout=2).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    values = dict(re.findall(r'^\s*X11 (\w+):\s*(.*?)\s*$', output, re.MULTILINE))
+    names = {field: values.get(field.capitalize()) or None
+             for field in ('model', 'layout', 'variant', 'options')}
+    return names if names['layout'] else None
+
+
+def _config_layout(path, pattern, fields):
+    """RMLVO names from a keyboard configuration file, or None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+    values = dict(re.findall(pattern, text, re.MULTILINE))
+    names = {field: values.get(key) or None for key, field in fields.items()}
+    return names if names['layout'] else None
+
+
+def _system_layout():
+    """The layout configured for the system console/X11, or None"""
+    return (_localectl_layout()
+            or _config_layout(_XORG_KEYBOARD_CONF, r'^\s*Option\s+"(Xkb\w+)"\s+"([^"]*)"',
+                              {'XkbModel': 'model', 'XkbLayout': 'layout',
+                               'XkbVariant': 'variant', 'XkbOptions': 'options'})
+            or _config_layout(_DEBIAN_KEYBOARD_CONF, r'^\s*(XKB\w+)=["\']?([^"\'\n]*)',
+                              {'XKBMODEL': 'model', 'XKBLAYOUT': 'layout',
+                               'XKBVARIANT': 'variant', 'XKBOPTIONS': 'options'}))
+
+
+def detect_layout():
+    """Best guess at the active layout: compositor first, then XKB_DEFAULT_*,
+    then the system keyboard configuration.
+
+    The system configuration is only a guess (the session may use another
+    layout, and only its first group is used), so falling back to it or to
+    xkbcommon's defaults prints a warning. Fields left as None are filled in
+    by xkbcommon from the environment and its compiled-in defaults.
+    """
+    detected = _hyprland_layout()
+    if detected:
+        return detected
+    if os.environ.get('XKB_DEFAULT_LAYOUT'):
+        return {}, 0
+    names = _system_layout()
+    if names:
+        label = names['layout'] + (f" ({names['variant']})" if names['variant'] else '')
+        print(f"⚠️  Keyboard layout unknown to the compositor; using the system layout {label}")
+        return names, 0
+    print("⚠️  Keyboard layout unknown; assuming xkbcommon's default (usually US)")
+    return {}, 0
+
+
+def compile_tables(names=None, group=0):
+    """Compile KeymapTables for the given RMLVO names, or None if xkbcommon is missing"""
+    global _xkb
+    if _xkb is None:
+        _xkb = _load_xkbcommon() or False
+    if not _xkb:
+        return None
+    names = names or {}
+
+    context = _xkb.xkb_context_new(0)
+    if not context:
+        return None
+    rule_names = _RuleNames(*(names.get(field) and names[field].encode()
+                              for field in ('rules', 'model', 'layout', 'variant', 'options')))
+    keymap = _xkb.xkb_keymap_new_from_names(context, ctypes.byref(rule_names), 0)
+    if not keymap:
+        _xkb.xkb_context_unref(context)
+        return None
+
+    def mod_mask(name):
+        index = _xkb.xkb_keymap_mod_get_index(keymap, name)
+        return 0 if index == _XKB_MOD_INVALID else 1 << index
+
+    shift, lock, level3 = mod_mask(b'Shift'), mod_mask(b'Lock'), mod_mask(b'Mod5')
+    name_buf = ctypes.create_string_buffer(64)
+    state = _xkb.xkb_state_new(keymap)
+    levels = []
+    level3_codes = set()
+    try:
+        for level in range(8):
+            depressed = (shift if level & SHIFT else 0) | (level3 if level & ALTGR else 0)
+            locked = lock if level & CAPS else 0
+            _xkb.xkb_state_update_mask(state, depressed, 0, locked, 0, 0, group)
+            table = [None] * TABLE_SIZE
+            for code in range(TABLE_SIZE):
+                keycode = code + _XKB_OFFSET
+                sym = _xkb.xkb_state_key_get_one_sym(state, keycode)
+                if not sym:
+                    continue
+                _xkb.xkb_keysym_get_name(sym, name_buf, len(name_buf))
+                sym_name = name_buf.value.decode()
+                if sym_name in _DEAD_KEYS:
+                    table[code] = DeadKey(*_DEAD_KEYS[sym_name])
+                    continue
+                if level == 0 and sym_name == 'ISO_Level3_Shift':
+                    level3_codes.add(code)
+                codepoint = _xkb.xkb_state_key_get_utf32(state, keycode)
+                if codepoint and chr(codepoint).isprintable() and not chr(codepoint).isspace():
+                    table[code] = chr(codepoint)
+            levels.append(table)
+    finally:
+        _xkb.xkb_state_unref(state)
+        _xkb.xkb_keymap_unref(keymap)
+        _xkb.xkb_context_unref(context)
+
+    label = names.get('layout') or os.environ.get('XKB_DEFAULT_LAYOUT') or 'default'
+    if names.get('variant'):
+        label += f" ({names['variant']})"
+    return KeymapTables(label, tuple(levels), level3_codes)
+
+
+def load_tables(fallback_normal, fallback_shifted):
+    """Tables for the active layout, falling back to US QWERTY"""
+    names, group = detect_layout()
+    try:
+        tables = compile_tables(names, group)
+    except Exception as e:
+        print(f"⚠️  Could not compile keymap ({e})")
+        tables = None
+    return tables or us_tables(fallback_normal, fallback_shifted)
@@ -0,0 +1,612 @@
+"""Incremental abbreviation matching for the text expander"""
+import functools
+import re
+import threading
+from collections import deque
+
+from Expander.templates import BoundTemplate, compile_template
+
+# Trigger modes: expand when a delimiter ends the word, or as soon as the
+# last character of the abbreviation is typed.
+DELIMITER = 'delimiter'
+IMMEDIATE = 'immediate'
+
+
+def app_key(app):
+    """Window classes are compared case-insensitively"""
+    return app.lower() if app else None
+
+
+def _fold(char):
+    lower = char.lower()
+    return lower if len(lower) == 1 else char
+
+
+def _variants(char):
+    """Characters a case-propagating abbreviation accepts in place of char"""
+    return {c for c in (char, char.lower(), char.upper()) if len(c) == 1}
+
+
+def propagate_case(typed, replacement):
+    """Give replacement the capitalization of the typed abbreviation:
+    btw -> as written, Btw -> first letter upper, BTW -> all upper."""
+    letters = [c for c in typed if c.isalpha()]
+    if not letters or letters[0].islower():
+        return replacement
+    if len(letters) > 1 and all(c.isupper() for c in letters):
+        return replacement.upper()
+    for i, char in enumerate(replacement):
+        if char.isalpha():
+            return replacement[:i] + char.upper() + replacement[i + 1:]
+    return replacement
+
+
+class _Entry:
+    __slots__ = ('abbrev', 'replacement', 'plan', 'trigger', 'propagate_case')
+
+    def __init__(self, abbrev, replacement, trigger=DELIMITER, propagate_case=False):
+        self.abbrev = abbrev
+        self.replacement = replacement
+        # The replacement itself, or its Template if it has placeholders
+        self.plan = compile_template(replacement)
+        self.trigger = trigger
+        self.propagate_case = propagate_case
+
+
+class _Node:
+    """Trie node for one case-folded prefix.
+
+    `children` maps each typed character to the node of the extended prefix;
+    the lower and upper case of a letter can point to the same node, which
+    is how case-propagating entries are stored once yet reached by every
+    capitalization. Entries whose abbreviation folds to this prefix live in
+    `entries`.
+    """
+
+    __slots__ = ('children', 'entries', 'depth', 'immediate')
+
+    def __init__(self, depth=0, children=None, entries=(), immediate=False):
+        self.children = {} if children is None else children
+        self.depth = depth
+        self.entries = entries
+        self.immediate = immediate
+
+    def set_entries(self, entries):
+        self.entries = entries
+        self.immediate = any(entry.trigger == IMMEDIATE for entry in entries)
+
+    def copy(self):
+        return _Node(self.depth, dict(self.children), self.entries, self.immediate)
+
+    def child(self, char):
+        """Existing node for char's folded prefix, under whichever case it was stored"""
+        node = self.children.get(char)
+        if node is not None:
+            return node
+        lower = char.lower()
+        if lower == char and char.upper() == char:
+            # Uncased (digits, punctuation): no other key can lead here
+            return None
+        for key in (lower, char.upper()):
+            if key != char and len(key) == 1:
+                node = self.children.get(key)
+                if node is not None and _fold(key) == _fold(char):
+                    return node
+        return None
+
+    def link(self, char, keys, node, old=None):
+        """Point keys at node, along with every case alias of char that led to old"""
+        if old is not None:
+            for key in _variants(char):
+                if self.children.get(key) is old:
+                    self.children[key] = node
+        for key in keys:
+            self.children[key] = node
+
+    def unique_children(self):
+        seen = set()
+        for node in self.children.values():
+            if id(node) not in seen:
+                seen.add(id(node))
+                yield node
+
+
+def _keys(entry, char):
+    return _variants(char) if entry.propagate_case else (char,)
+
+
+def _replace_entry(entries, entry):
+    """(entries with entry added or replacing the same abbreviation, whether it was new)"""
+    kept = tuple(e for e in entries if e.abbrev != entry.abbrev)
+    return kept + (entry,), len(kept) == len(entries)
+
+
+class _Rule:
+    __slots__ = ('pattern', 'replacement', 'plan', 'propagate_case', 'regex')
+
+    def __init__(self, pattern, replacement, propagate_case, regex):
+        self.pattern = pattern
+        self.replacement = replacement
+        self.plan = compile_template(replacement)
+        self.propagate_case = propagate_case
+        self.regex = regex
+
+
+# Backreferences refer to group numbers that shift inside the combined
+# alternation, and global flags like (?i) are only allowed at the start of
+# the whole expression; patterns using either are matched on their own.
+_STANDALONE = re.compile(r'\\[1-9]|\(\?P=|\(\?[aiLmsux]+\)')
+_NAMED_GROUP = re.compile(r'\(\?P<\w+>')
+
+
+class _PatternSet:
+    """Regex triggers compiled into one alternation.
+
+    The last word is run through a single fullmatch no matter how many
+    rules there are; the outer group that matched tells which rule it was,
+    and only that rule's own pattern is run again to fill in the replacement.
+    """
+
+    __slots__ = ('rules', '_combined', '_owners', '_standalone')
+
+    def __init__(self, rules=()):
+        self.rules = rules
+        self._owners = {}
+        self._standalone = []
+        parts = []
+        group = 1
+        for rule in rules:
+            if _STANDALONE.search(rule.pattern):
+                self._standalone.append(rule)
+                continue
+            # Group names would clash between alternatives; the combined
+            # pattern only needs to know which alternative matched.
+            body = _NAMED_GROUP.sub('(', rule.pattern)
+            parts.append(f"({'(?i:' if rule.propagate_case else '(?:'}{body}))")
+            self._owners[group] = rule
+            group += 1 + rule.regex.groups
+        self._combined = None
+        if parts:
+            try:
+                self._combined = re.compile('|'.join(parts))
+            except (re.error, RecursionError) as e:
+                print(f"⚠️  Could not combine regex triggers ({e}); matching them one by one")
+                self._owners = {}
+                self._standalone = list(rules)
+
+    @classmethod
+    def compile(cls, rules):
+        valid = []
+        for pattern, replacement, propagate in rules:
+            try:
+                flags = re.IGNORECASE if propagate else 0
+                valid.append(_Rule(pattern, replacement, propagate, re.compile(pattern, flags)))
+            except re.error as e:
+                print(f"⚠️  Skipping invalid pattern {pattern!r}: {e}")
+        return cls(tuple(valid))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def find(self, pattern):
+        return next((rule for rule in self.rules if rule.pattern == pattern), None)
+
+    def match(self, word):
+        """(word, replacement) for the first rule matching the whole word"""
+        rule = None
+        if self._combined is not None:
+            combined = self._combined.fullmatch(word)
+            if combined:
+                rule = self._owners[combined.lastindex]
+        if rule is None:
+            rule = next((r for r in self._standalone if r.regex.fullmatch(word)), None)
+        if rule is None:
+            return None
+        match = rule.regex.fullmatch(word)
+        if rule.plan is not rule.replacement:
+            # Groups are substituted into the literal parts when rendered
+            return word, BoundTemplate(
+                rule.plan, functools.partial(_expand_groups, rule, match),
+                functools.partial(propagate_case, word) if rule.propagate_case else None)
+        replacement = _expand_groups(rule, match, rule.replacement)
+        if rule.propagate_case:
+            replacement = propagate_case(word, replacement)
+        return word, replacement
+
+
+def _expand_groups(rule, match, text):
+    try:
+        return match.expand(text)
+    except (re.error, IndexError) as e:
+        print(f"⚠️  Bad replacement template for {rule.pattern!r}: {e}")
+        return text
+
+
+_NO_PATTERNS = _PatternSet()
+
+
+class AbbreviationTable:
+    """Immutable trie over all literal abbreviations, plus the regex triggers.
+
+    Tables are never modified once built: edits return a new table that
+    shares every untouched branch with the old one, so a table can be handed
+    to the listener thread and read there without any locking.
+    """
+
+    __slots__ = ('root', 'patterns', 'longest', '_count', '_lengths')
+
+    def __init__(self, root=None, count=0, lengths=None, patterns=_NO_PATTERNS):
+        self.root = _Node() if root is None else root
+        self.patterns = patterns
+        self._count = count
+        self._lengths = {} if lengths is None else lengths
+        self.longest = max(self._lengths, default=0)
+
+    @classmethod
+    def build(cls, items):
+        """Compile a table from (abbrev, replacement[, trigger[, propagate_case[, regex]]])
+        tuples; with regex set, abbrev is a pattern matched against the last word."""
+        root = _Node()
+        count = 0
+        lengths = {}
+        rules = {}
+        entries = []
+        for abbrev, replacement, *options in items:
+            if len(options) > 2 and options[2]:
+                rules[abbrev] = (abbrev, replacement, len(options) > 1 and options[1])
+            else:
+                entries.append(_Entry(abbrev, replacement, *options[:2]))
+        # Another case of a typed character can only lead to an existing node
+        # if some abbreviation has that character in a form other than its
+        # folded one, or propagates case through it; for every other
+        # character a missing key is simply a new node.
+        probe = set()
+        for entry in entries:
+            if entry.propagate_case or entry.abbrev.lower() != entry.abbrev:
+                for char in entry.abbrev:
+                    if entry.propagate_case or _fold(char) != char:
+                        probe |= _variants(char)
+        for entry in entries:
+            abbrev = entry.abbrev
+            propagate = entry.propagate_case
+            node = root
+            for char in abbrev:
+                # A node built here is reachable only through the case
+                # aliases of one prefix, so it can be extended in place.
+                child = node.children.get(char)
+                if child is None:
+                    child = node.child(char) if char in probe else None
+                    if child is None:
+                        child = _Node(node.depth + 1)
+                    if propagate:
+                        node.link(char, _variants(char), child)
+                    else:
+                        node.children[char] = child
+                elif propagate:
+                    # Exact-case entries only need the key they were typed with
+                    node.link(char, _variants(char), child)
+                node = child
+            if node.entries:
+                entries_here, added = _replace_entry(node.entries, entry)
+                node.set_entries(entries_here)
+            else:
+                node.entries = (entry,)
+                node.immediate = entry.trigger == IMMEDIATE
+                added = True
+            if added:
+                count += 1
+                lengths[len(abbrev)] = lengths.get(len(abbrev), 0) + 1
+        patterns = _PatternSet.compile(rules.values()) if rules else _NO_PATTERNS
+        return cls(root, count, lengths, patterns)
+
+    def __len__(self):
+        return self._count + len(self.patterns)
+
+    def __contains__(self, abbrev):
+        return self._find(abbrev) is not None or self.patterns.find(abbrev) is not None
+
+    def __iter__(self):
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for entry in node.entries:
+                yield entry.abbrev
+            stack.extend(node.unique_children())
+        for rule in self.patterns.rules:
+            yield rule.pattern
+
+    def _path(self, abbrev):
+        path = [self.root]
+        for char in abbrev:
+            child = path[-1].children.get(char)
+            if child is None:
+                return None
+            path.append(child)
+        return path
+
+    def _find(self, abbrev):
+        path = self._path(abbrev)
+        if path is None:
+            return None
+        return next((e for e in path[-1].entries if e.abbrev == abbrev), None)
+
+    def get(self, abbrev, default=None):
+        entry = self._find(abbrev) or self.patterns.find(abbrev)
+        return default if entry is None else entry.replacement
+
+    def plan(self, abbrev):
+        """Replacement of a literal abbreviation as str or Template, or None"""
+        entry = self._find(abbrev)
+        return None if entry is None else entry.plan
+
+    def match_pattern(self, word):
+        """(word, replacement) if a regex trigger matches the whole word"""
+        return self.patterns.match(word) if self.patterns.rules else None
+
+    def _with_rules(self, rules):
+        patterns = _PatternSet.compile(rules) if rules else _NO_PATTERNS
+        return AbbreviationTable(self.root, self._count, self._lengths, patterns)
+
+    def with_entry(self, abbrev, replacement, trigger=DELIMITER, propagate_case=False,
+                   regex=False):
+        """Return a copy of the table with abbrev added or replaced"""
+        if regex:
+            rules = [(r.pattern, r.replacement, r.propagate_case)
+                     for r in self.patterns.rules if r.pattern != abbrev]
+            return self._with_rules(rules + [(abbrev, replacement, propagate_case)])
+        entry = _Entry(abbrev, replacement, trigger, propagate_case)
+        root = node = self.root.copy()
+        for char in abbrev:
+            old = node.child(char)
+            child = _Node(node.depth + 1) if old is None else old.copy()
+            node.link(char, _keys(entry, char), child, old)
+            node = child
+
+        entries, added = _replace_entry(node.entries, entry)
+        node.set_entries(entries)
+        count = self._count
+        lengths = self._lengths
+        if added:
+            count += 1
+            lengths = dict(lengths)
+            lengths[len(abbrev)] = lengths.get(len(abbrev), 0) + 1
+        return AbbreviationTable(root, count, lengths, self.patterns)
+
+    def without(self, abbrev):
+        """Return a copy of the table with abbrev removed"""
+        if self.patterns.find(abbrev) is not None:
+            return self._with_rules([(r.pattern, r.replacement, r.propagate_case)
+                                     for r in self.patterns.rules if r.pattern != abbrev])
+        path = self._path(abbrev)
+        if path is None or not any(e.abbrev == abbrev for e in path[-1].entries):
+            return self
+
+        # Rebuild the path bottom-up, dropping branches that become empty.
+        # Case aliases of surviving nodes stay; they lead to the same prefix
+        # and never produce a match on their own.
+        node = path[-1].copy()
+        node.set_entries(tuple(e for e in node.entries if e.abbrev != abbrev))
+        for char, parent in zip(reversed(abbrev), reversed(path[:-1])):
+            old = parent.children[char]
+            parent = parent.copy()
+            if node.children or node.entries:
+                parent.link(char, (char,), node, old)
+            else:
+                for key in _variants(char):
+                    if parent.children.get(key) is old:
+                        del parent.children[key]
+            node = parent
+
+        lengths = dict(self._lengths)
+        remaining = lengths.pop(len(abbrev)) - 1
+        if remaining:
+            lengths[len(abbrev)] = remaining
+        return AbbreviationTable(node, self._count - 1, lengths, self.patterns)
+
+    def derive(self, added=(), removed=()):
+        """Copy of the table with the abbrevs in removed dropped and the
+        (abbrev, replacement[, trigger[, propagate_case[, regex]]]) items
+        in added put in; untouched branches are shared with this table."""
+        table = self
+        for abbrev in removed:
+            table = table.without(abbrev)
+        rules = []
+        for abbrev, replacement, *options in added:
+            if len(options) > 2 and options[2]:
+                rules.append((abbrev, replacement, len(options) > 1 and options[1]))
+            else:
+                table = table.with_entry(abbrev, replacement, *options[:2])
+        if rules:
+            patterns = {rule[0]: rule for rule in rules}
+            kept = [(r.pattern, r.replacement, r.propagate_case)
+                    for r in table.patterns.rules if r.pattern not in patterns]
+            table = table._with_rules(kept + list(patterns.values()))
+        return table
+
+
+def _scope(item):
+    """(apps, exclude_apps) of an item, as sets of app keys"""
+    apps = item[5] if len(item) > 5 else None
+    exclude = item[6] if len(item) > 6 else None
+    return (frozenset(app_key(app) for app in apps or ()),
+            frozenset(app_key(app) for app in exclude or ()))
+
+
+def build_scoped(items):
+    """Compile items into the global table and one table per application.
+
+    Items are (abbrev, replacement[, trigger[, propagate_case[, regex[,
+    apps[, exclude_apps]]]]]) tuples. Items without apps go in the global
+    table; every application named in apps or exclude_apps gets a table of
+    its own, derived from the global one, with its excluded items taken out
+    and its own items added.
+    """
+    items = list(items)
+    scopes = [_scope(item) for item in items]
+    table = AbbreviationTable.build(item for item, (apps, _) in zip(items, scopes) if not apps)
+    named = set()
+    for apps, exclude in scopes:
+        named |= apps | exclude
+    scoped = {}
+    for app in named:
+        scoped[app] = table.derive(
+            added=[item for item, (apps, _) in zip(items, scopes) if app in apps],
+            removed=[item[0] for item, (apps, exclude) in zip(items, scopes)
+                     if not apps and app in exclude])
+    return table, scoped
+
+
+class AbbreviationMatcher:
+    """Holds the published tables and hands out cursors that walk them.
+
+    There is a global table and one per application scope; `table` is the
+    one for the focused application. It is chosen when focus changes, so
+    cursors read a single attribute, as they did before scopes existed.
+    Publishing is a reference assignment; cursors pick up a new table at
+    their next word boundary and keep walking the (unchanged) old one until
+    then.
+    """
+
+    def __init__(self, table=None):
+        self.table = self.default = AbbreviationTable() if table is None else table
+        self.scoped = {}
+        self.app = None
+        self._lock = threading.Lock()
+
+    def publish(self, table, scoped=None):
+        """Swap in a new global table and per-application tables"""
+        with self._lock:
+            self.default = table
+            self.scoped = {} if scoped is None else scoped
+            self.table = self.scoped.get(self.app, table)
+
+    def focus(self, app):
+        """Switch to the table of the newly focused application (window class)"""
+        with self._lock:
+            self.app = app_key(app)
+            self.table = self.scoped.get(self.app, self.default)
+
+    def cursor(self, typed):
+        """Cursor over the characters appended to `typed` (a KeyBuffer)"""
+        return MatchCursor(self, typed)
+
+
+class TableBuilder:
+    """Applies table changes on a background thread, one at a time, in order.
+
+    A change is a function from the published (global table, per-app
+    tables) to new ones, which are then published. Building 50k entries
+    takes about a second, so callers such as the Tk thread only queue the
+    work. A full rebuild makes any changes still queued before it moot and
+    drops them.
+    """
+
+    def __init__(self, matcher):
+        self._matcher = matcher
+        self._changes = deque()
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, change, replaces=False):
+        with self._cond:
+            if replaces:
+                self._changes.clear()
+            self._changes.append(change)
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until every submitted change is published"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._changes and not self._busy, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._changes)
+                change = self._changes.popleft()
+                self._busy = True
+            try:
+                self._matcher.publish(*change(self._matcher.default, self._matcher.scoped))
+            except Exception as e:
+                print(f"❌ Failed to update abbreviations: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+
+# Cursor position before the first character of a word. The root is only
+# looked up when that character arrives, so a table published in between
+# (at startup, or by an edit) is used right away.
+_WORD_START = _Node()
+
+
+class MatchCursor:
+    """Position of one input source in the abbreviation trie.
+
+    The cursor follows the word currently being typed, so each keystroke is a
+    single child lookup and "did an abbreviation just end here" is answered
+    without looking at the rest of the table. Only at a node holding entries
+    is the typed word read back from the buffer, to choose between exact-case
+    and case-propagating entries.
+
+    Replacements with placeholders come back as templates, which are
+    rendered on the expansion worker rather than here.
+    """
+
+    __slots__ = ('_matcher', '_node', '_typed')
+
+    def __init__(self, matcher, typed):
+        self._matcher = matcher
+        self._typed = typed
+        self._node = _WORD_START
+
+    def reset(self):
+        """Forget the word in progress"""
+        self._node = _WORD_START
+
+    def feed(self, char):
+        """Advance the cursor by one character, after it went into the buffer.
+
+        Returns (typed, replacement) when this character completes an
+        immediate-trigger abbreviation, and starts a new word.
+        """
+        node = self._node
+        if node is _WORD_START:
+            node = self._matcher.table.root
+        elif node is None:
+            return None
+        node = self._node = node.children.get(char)
+        if node is not None and node.immediate:
+            match = self._resolve(node, IMMEDIATE)
+            if match:
+                self._node = _WORD_START
+                return match
+        return None
+
+    def end_word(self):
+        """Close the current word; return (typed, replacement) if it matched.
+
+        Call before the delimiter goes into the buffer.
+        """
+        node = self._node
+        self._node = _WORD_START
+        if node is None or not node.entries:
+            return None
+        return self._resolve(node, DELIMITER)
+
+    def _resolve(self, node, trigger):
+        typed = self._typed.tail(node.depth)
+        candidates = [e for e in node.entries if e.trigger == trigger]
+        for entry in candidates:
+            if not entry.propagate_case and entry.abbrev == typed:
+                return typed, entry.plan
+        for entry in candidates:
+            if entry.propagate_case:
+                if entry.plan is entry.replacement:
+                    return typed, propagate_case(typed, entry.replacement)
+                return typed, BoundTemplate(entry.plan,
+                                            transform=functools.partial(propagate_case, typed))
+        return None
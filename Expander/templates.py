@@ -0,0 +1,144 @@
+"""Dynamic placeholders in replacements, parsed once into render plans"""
+import os
+import re
+import time
+import uuid
+
+# {name} or {name:argument}; doubled braces are literal braces
+_TOKEN = re.compile(r'\{\{|\}\}|\{(\w+)(?::([^{}]*))?\}')
+
+PLACEHOLDERS = ('date', 'clipboard', 'uuid', 'env', 'snippet', 'cursor')
+
+# How deep {snippet:...} references may nest before we assume a cycle
+MAX_DEPTH = 8
+
+
+class TemplateContext:
+    """What placeholders can reach while rendering.
+
+    `clipboard` returns the current clipboard text (or None); `lookup`
+    returns the replacement of another abbreviation (a str or Template) or
+    None.
+    """
+
+    __slots__ = ('clipboard', 'lookup', 'depth')
+
+    def __init__(self, clipboard=None, lookup=None, depth=0):
+        self.clipboard = clipboard or (lambda: None)
+        self.lookup = lookup or (lambda name: None)
+        self.depth = depth
+
+    def nested(self):
+        return TemplateContext(self.clipboard, self.lookup, self.depth + 1)
+
+
+class Template:
+    """Render plan: literal text and placeholders, in order.
+
+    Built once from the replacement text; rendering only evaluates the
+    placeholders and joins the pieces.
+    """
+
+    __slots__ = ('source', 'parts')
+
+    def __init__(self, source, parts):
+        self.source = source
+        self.parts = parts
+
+    def render(self, context, expand=None, transform=None):
+        """Return (text, lefts): lefts is how many characters follow {cursor}.
+
+        `expand` is applied to the literal parts (a regex match's group
+        substitution), `transform` to the finished text.
+        """
+        out = []
+        cursor = None
+        for part in self.parts:
+            if part.__class__ is str:
+                out.append(expand(part) if expand else part)
+                continue
+            kind, arg = part
+            if kind == 'cursor':
+                if cursor is None:
+                    cursor = len(out)
+            elif kind == 'date':
+                out.append(time.strftime(arg or '%Y-%m-%d'))
+            elif kind == 'clipboard':
+                out.append(context.clipboard() or '')
+            elif kind == 'uuid':
+                out.append(str(uuid.uuid4()))
+            elif kind == 'env':
+                out.append(os.environ.get(arg, ''))
+            elif kind == 'snippet':
+                out.append(_render_snippet(arg, context))
+        text = ''.join(out)
+        lefts = len(''.join(out[cursor:])) if cursor is not None else 0
+        if transform:
+            text = transform(text)
+        return text, lefts
+
+
+class BoundTemplate:
+    """A template together with what its match contributes (regex groups,
+    case propagation), rendered later on the expansion worker."""
+
+    __slots__ = ('template', 'expand', 'transform')
+
+    def __init__(self, template, expand=None, transform=None):
+        self.template = template
+        self.expand = expand
+        self.transform = transform
+
+    def render(self, context):
+        return self.template.render(context, self.expand, self.transform)
+
+
+def _render_snippet(name, context):
+    if context.depth >= MAX_DEPTH:
+        print(f"⚠️  Snippet references nested too deeply at {name!r}")
+        return ''
+    replacement = context.lookup(name)
+    if replacement is None:
+        return ''
+    if replacement.__class__ is str:
+        return replacement
+    return replacement.render(context.nested())[0]
+
+
+def compile_template(text):
+    """Parse a replacement; returns text unchanged if it has no placeholders.
+
+    Doubled braces only act as escapes in text that has a placeholder, so
+    existing snippets with literal braces keep working.
+    """
+    if '{' not in text:
+        return text
+    tokens = list(_TOKEN.finditer(text))
+    if not any(token.group(1) in PLACEHOLDERS for token in tokens):
+        return text
+    parts = []
+    literal = []
+    pos = 0
+    for token in tokens:
+        literal.append(text[pos:token.start()])
+        pos = token.end()
+        whole, name, arg = token.group(0), token.group(1), token.group(2)
+        if whole in ('{{', '}}'):
+            literal.append(whole[0])
+        elif name in PLACEHOLDERS:
+            parts.append(''.join(literal))
+            literal = []
+            parts.append((name, arg))
+        else:
+            # Not ours: keep it as typed
+            literal.append(whole)
+    literal.append(text[pos:])
+    parts.append(''.join(literal))
+    return Template(text, tuple(part for part in parts if part != ''))
+
+
+def render(replacement, context):
+    """(text, lefts) for a plain replacement string or a render plan"""
+    if replacement.__class__ is str:
+        return replacement, 0
+    return replacement.render(context)
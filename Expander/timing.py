@@ -0,0 +1,127 @@
+"""Per-application injection delays, tuned from measured input latency"""
+import json
+import os
+import threading
+import time
+
+
+class _AppTiming:
+    __slots__ = ('latency', 'samples', 'misses')
+
+    def __init__(self, latency, samples=0, misses=0):
+        self.latency = latency
+        self.samples = samples
+        self.misses = misses
+
+
+class TimingProfiles:
+    """Learns how fast each application (by window class) consumes input.
+
+    The latency sample is the time between pressing Ctrl+V and the target
+    fetching the clipboard, which covers draining the backspaces queued in
+    front of it. Delays are derived from a moving average of that latency,
+    so a terminal converges to a few milliseconds while a slow Electron app
+    gets more room. A paste that is never fetched doubles the estimate.
+    Applications never measured use the old fixed delays.
+
+    Only pastes through an observable clipboard (TkClipboard on X11 and
+    XWayland) produce samples, and only when the focused window is known.
+    Typed text (UInput, wtype, pynput) can't be observed, so an app that
+    never receives such a paste, like a native Wayland terminal, keeps the
+    defaults, including the settle before a wtype fallback.
+    """
+
+    DEFAULT_LATENCY = 0.02
+    ALPHA = 0.3
+    SAVE_INTERVAL = 10.0
+
+    # delay = factor * latency, clamped to [low, high]
+    SETTLE = (2.0, 0.002, 0.1)
+    PASTE_WAIT = (5.0, 0.01, 0.5)
+    PASTE_TIMEOUT = (20.0, 1.0, 3.0)
+
+    def __init__(self, timing_file="user/Timing.json"):
+        self.timing_file = timing_file
+        self._apps = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = 0.0
+        self.load()
+
+    def load(self):
+        """Load measured latencies from JSON file"""
+        if not os.path.exists(self.timing_file):
+            return
+        try:
+            with open(self.timing_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._apps = {
+                app: _AppTiming(entry['latency_ms'] / 1000,
+                                entry.get('samples', 0), entry.get('misses', 0))
+                for app, entry in data.items()
+            }
+        except (json.JSONDecodeError, IOError, KeyError, TypeError) as e:
+            print(f"⚠️  Ignoring unreadable {self.timing_file}: {e}")
+
+    def save(self):
+        """Save measured latencies to JSON file"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {app: {'latency_ms': round(t.latency * 1000, 2),
+                          'samples': t.samples, 'misses': t.misses}
+                    for app, t in self._apps.items()}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        try:
+            with open(self.timing_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+        except IOError as e:
+            print(f"Failed to save timing: {e}")
+
+    def record(self, app, latency):
+        """Add a latency sample in seconds for app; None means it never responded"""
+        if not app or (latency is not None and latency <= 0):
+            return
+        with self._lock:
+            timing = self._apps.get(app)
+            if timing is None:
+                timing = self._apps[app] = _AppTiming(
+                    self.DEFAULT_LATENCY if latency is None else latency)
+            if latency is None:
+                timing.misses += 1
+                timing.latency = min(timing.latency * 2,
+                                     self.PASTE_TIMEOUT[2] / self.PASTE_TIMEOUT[0])
+            else:
+                timing.samples += 1
+                timing.latency += self.ALPHA * (latency - timing.latency)
+            self._dirty = True
+            due = time.monotonic() - self._saved_at >= self.SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def latency(self, app):
+        timing = self._apps.get(app) if app else None
+        return self.DEFAULT_LATENCY if timing is None else timing.latency
+
+    def _delay(self, app, rule):
+        factor, low, high = rule
+        return min(max(factor * self.latency(app), low), high)
+
+    def settle(self, app):
+        """Pause between injecting through one channel and the next"""
+        return self._delay(app, self.SETTLE)
+
+    def paste_wait(self, app):
+        """Time to leave a paste in the clipboard when fetches can't be observed"""
+        return self._delay(app, self.PASTE_WAIT)
+
+    def paste_timeout(self, app):
+        """Longest wait for the target to fetch a paste"""
+        return self._delay(app, self.PASTE_TIMEOUT)
+
+    def stats(self):
+        """(app, latency_ms, samples, misses) for every measured app, slowest first"""
+        with self._lock:
+            rows = [(app, t.latency * 1000, t.samples, t.misses) for app, t in self._apps.items()]
+        return sorted(rows, key=lambda row: row[1], reverse=True)
@@ -0,0 +1,75 @@
+"""Background execution of expansions"""
+import queue
+import threading
+import time
+
+
+class ExpansionWorker:
+    """Runs expansion jobs one at a time, in submission order, on its own thread.
+
+    The keyboard listener only detects matches and submits them here, so the
+    backspaces, sleeps and subprocesses of an expansion never block capture.
+    Queue wait and service time are tracked separately for diagnostics.
+    """
+
+    def __init__(self, handler):
+        self._handler = handler
+        self._queue = queue.Queue()
+        self._thread = None
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.total_service = 0.0
+        self.max_wait = 0.0
+        self.max_service = 0.0
+        self.last_service = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=1.0):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def submit(self, *args):
+        self._queue.put((time.perf_counter(), args))
+
+    def stats(self):
+        done = self.completed or 1
+        return {
+            'queued': self._queue.qsize(),
+            'completed': self.completed,
+            'failed': self.failed,
+            'avg_wait_ms': self.total_wait / done * 1000,
+            'max_wait_ms': self.max_wait * 1000,
+            'avg_service_ms': self.total_service / done * 1000,
+            'max_service_ms': self.max_service * 1000,
+            'last_service_ms': self.last_service * 1000,
+        }
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            submitted, args = job
+            started = time.perf_counter()
+            try:
+                self._handler(*args)
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Expansion error: {e}")
+            finished = time.perf_counter()
+
+            wait = started - submitted
+            service = finished - started
+            self.completed += 1
+            self.total_wait += wait
+            self.total_service += service
+            self.max_wait = max(self.max_wait, wait)
+            self.max_service = max(self.max_service, service)
+            self.last_service = service
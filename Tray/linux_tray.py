@@ -88,7 +88,7 @@ class TrayIcon:
             self.update_x11_menu()
 
     def clear_buffer(self):
-        self.app.text_expander.buffer = ""
+        self.app.text_expander.clear_buffer()
         self.show_notification("Buffer cleared")
 
     def show_stats(self):
@@ -96,6 +96,9 @@ class TrayIcon:
                              if isinstance(v, dict) and not v.get('ignored', False)])
         active_abbrevs = len(self.app.text_expander.abbreviations)
         status = 'ENABLED' if self.app.text_expander.enabled else 'DISABLED'
+        expansion = self.app.text_expander.expansion_stats()
+        timing = self.app.text_expander.expansion_timing()
+        latency = ', '.join(f"{app} {ms:.0f} ms" for app, ms, _, _ in timing[:3]) or 'not measured yet'
 
         category_data = self.app.category_manager.categories if hasattr(self.app, 'category_manager') else {}
         total_categories = len(category_data)
@@ -109,6 +112,9 @@ class TrayIcon:
             f"Total Abbrevs: {total_abbrevs} | Active: {active_abbrevs}\n"
             f"Categories: {total_categories} | Encrypted: {encrypted_categories}\n"
             f"Status: {status}\n"
+            f"Expansions: {expansion['completed']} | Queued: {expansion['queued']} | "
+            f"Avg: {expansion['avg_service_ms']:.0f} ms\n"
+            f"Input latency: {latency}\n"
             f"Memory: {memory_mb:.1f} MB | CPU: {cpu_percent:.1f}%"
         )
 
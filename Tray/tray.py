@@ -147,7 +147,7 @@ class TrayIcon:
     def clear_buffer(self, icon=None, item=None):
         """Clear the text expansion buffer"""
         try:
-            self.app.text_expander.buffer = ""
+            self.app.text_expander.clear_buffer()
             self.show_notification("Buffer cleared")
         except Exception as e:
             print(f"Clear buffer error: {e}")
@@ -160,6 +160,9 @@ class TrayIcon:
                                  if isinstance(v, dict) and not v.get('ignored', False)])
             active_abbrevs = len(self.app.text_expander.abbreviations)
             status = 'ENABLED' if self.app.text_expander.enabled else 'DISABLED'
+            expansion = self.app.text_expander.expansion_stats()
+            timing = self.app.text_expander.expansion_timing()
+            latency = ', '.join(f"{app} {ms:.0f} ms" for app, ms, _, _ in timing[:3]) or 'not measured yet'
 
             # Category stats
             category_data = self.app.category_manager.categories if hasattr(self.app, 'category_manager') else {}
@@ -175,6 +178,9 @@ class TrayIcon:
                 f"Total Abbrevs: {total_abbrevs} | Active: {active_abbrevs}\n"
                 f"Categories: {total_categories} | Encrypted: {encrypted_categories}\n"
                 f"Status: {status}\n"
+                f"Expansions: {expansion['completed']} | Queued: {expansion['queued']} | "
+                f"Avg: {expansion['avg_service_ms']:.0f} ms\n"
+                f"Input latency: {latency}\n"
                 f"Memory: {memory_mb:.1f} MB | CPU: {cpu_percent:.1f}%"
             )
 
@@ -0,0 +1,108 @@
+"""Micro-benchmark for the evdev key event decoding path.
+
+Compares the previous per-event path (InputEvent -> categorize() -> dict
+lookups -> KeyCode.from_char) with the raw struct + flat table decoding used
+by _EvdevListener, on a synthetic stream of typing. No input device needed:
+
+    python benchmarks/evdev_decode.py [events]
+"""
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Force the evdev listener to be defined even outside a Wayland session
+os.environ.setdefault('WAYLAND_DISPLAY', 'benchmark')
+
+from evdev import ecodes as ec, InputEvent, categorize, KeyEvent
+from pynput.keyboard import Key, KeyCode
+
+from Expander import Text_expander as tx
+from Expander.keymap import us_tables
+
+TEXT = "The quick brown fox jumps over the lazy dog, then types btw "
+RAW_EVENT = struct.Struct('llHHi')
+
+
+def make_events(count):
+    """(type, code, value) triples for typing TEXT repeatedly, with SYN frames"""
+    reverse = {char: (code, False) for code, char in tx._EvdevListener._NORMAL.items()}
+    reverse.update({char: (code, True) for code, char in tx._EvdevListener._SHIFTED.items()})
+    reverse[' '] = (ec.KEY_SPACE, False)
+
+    events = []
+    while len(events) < count:
+        for char in TEXT:
+            code, shifted = reverse[char]
+            keys = [(ec.KEY_LEFTSHIFT, 1)] if shifted else []
+            keys += [(code, 1), (code, 0)]
+            keys += [(ec.KEY_LEFTSHIFT, 0)] if shifted else []
+            for key, value in keys:
+                events.append((ec.EV_KEY, key, value))
+                events.append((ec.EV_SYN, ec.SYN_REPORT, 0))
+    return events[:count]
+
+
+def run_old(events):
+    """The decoding loop as it was before the raw path"""
+    normal, shifted, special = (tx._EvdevListener._NORMAL, tx._EvdevListener._SHIFTED,
+                                tx._EvdevListener._SPECIAL)
+    shift_codes, flush_mods = tx._EvdevListener._SHIFT_CODES, tx._EvdevListener._FLUSH_MODS
+    sink = []
+    shift = False
+    objects = [InputEvent(0, 0, type_, code, value) for type_, code, value in events]
+
+    start = time.perf_counter()
+    for event in objects:
+        if event.type != ec.EV_KEY:
+            continue
+        kev = categorize(event)
+        code, state = kev.scancode, kev.keystate
+        if code in shift_codes:
+            shift = state != KeyEvent.key_up
+            continue
+        if code in flush_mods:
+            if state == KeyEvent.key_down:
+                sink.append(Key.ctrl)
+            continue
+        if state == KeyEvent.key_up:
+            continue
+        if code in special:
+            sink.append(special[code])
+            continue
+        char = (shifted if shift else normal).get(code)
+        if char:
+            sink.append(KeyCode.from_char(char))
+    return time.perf_counter() - start, len(sink)
+
+
+def run_new(events):
+    sink = []
+    listener = tx._EvdevListener.__new__(tx._EvdevListener)
+    listener._keymap = listener._compile_keymap(
+        us_tables(tx._EvdevListener._NORMAL, tx._EvdevListener._SHIFTED))
+    listener._on_press = lambda key, source: sink.append(key)
+    listener._on_char = lambda char, source: sink.append(char)
+    listener._caps = 0
+    data = b''.join(RAW_EVENT.pack(0, 0, *event) for event in events)
+    chunks = [data[i:i + tx._READ_SIZE] for i in range(0, len(data), tx._READ_SIZE)]
+
+    state = tx._DeviceState()
+
+    start = time.perf_counter()
+    for chunk in chunks:
+        listener._dispatch(chunk, state)
+    return time.perf_counter() - start, len(sink)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    events = make_events(count)
+    for name, run in (('categorize + KeyCode', run_old), ('raw struct + tables', run_new)):
+        elapsed, emitted = run(events)
+        print(f"{name:22} {count / elapsed:>14,.0f} events/s  ({emitted} keys emitted)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Randomized check of the abbreviation trie against a reference matcher.
+
+Each trial makes a random set of abbreviations over a tiny alphabet (so
+abbreviations share prefixes and differ only in case), with random
+propagate_case and trigger options, and builds it two ways: with
+AbbreviationTable.build, and by a random sequence of with_entry/without
+edits. Random words are then typed through a MatchCursor over each table
+and the matches compared with a plain reference matcher. Exits non-zero on
+the first mismatch:
+
+    python benchmarks/matcher_check.py [trials] [seed]
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Expander.key_buffer import KeyBuffer
+from Expander.matcher import (AbbreviationMatcher, AbbreviationTable, DELIMITER, IMMEDIATE,
+                              propagate_case)
+
+ALPHABET = 'aAbB1ß'
+WORDS_PER_TRIAL = 40
+
+
+def random_abbrev(rng):
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 4)))
+
+
+def random_item(rng, index):
+    return (random_abbrev(rng), f"r{index} x", rng.choice((DELIMITER, IMMEDIATE)),
+            rng.random() < 0.3)
+
+
+def reference_match(entries, typed, trigger):
+    """(typed, replacement) for entries as a dict abbrev -> (replacement,
+    trigger, propagate_case), in the order they were last put in"""
+    candidates = [(abbrev, replacement, propagate)
+                  for abbrev, (replacement, mode, propagate) in entries.items()
+                  if mode == trigger and abbrev.lower() == typed.lower()]
+    for abbrev, replacement, propagate in candidates:
+        if not propagate and abbrev == typed:
+            return typed, replacement
+    for abbrev, replacement, propagate in candidates:
+        if propagate:
+            return typed, propagate_case(typed, replacement)
+    return None
+
+
+def reference_type(entries, word):
+    """Matches for typing word followed by a delimiter"""
+    matches = []
+    start = 0
+    for end in range(1, len(word) + 1):
+        match = reference_match(entries, word[start:end], IMMEDIATE)
+        if match:
+            matches.append(match)
+            start = end
+    if start < len(word):
+        match = reference_match(entries, word[start:], DELIMITER)
+        if match:
+            matches.append(match)
+    return matches
+
+
+def cursor_type(cursor, typed, word):
+    matches = []
+    for char in word:
+        typed.append(char)
+        match = cursor.feed(char)
+        if match:
+            matches.append(match)
+    match = cursor.end_word()
+    if match:
+        matches.append(match)
+    typed.append(' ')
+    return matches
+
+
+def run_trial(rng):
+    entries = {}
+    incremental = AbbreviationTable()
+    for index in range(rng.randint(1, 30)):
+        if entries and rng.random() < 0.25:
+            abbrev = rng.choice(list(entries)) if rng.random() < 0.8 else random_abbrev(rng)
+            entries.pop(abbrev, None)
+            incremental = incremental.without(abbrev)
+        else:
+            abbrev, replacement, trigger, propagate = random_item(rng, index)
+            entries.pop(abbrev, None)
+            entries[abbrev] = (replacement, trigger, propagate)
+            incremental = incremental.with_entry(abbrev, replacement, trigger, propagate)
+    built = AbbreviationTable.build(
+        (abbrev, replacement, trigger, propagate)
+        for abbrev, (replacement, trigger, propagate) in entries.items())
+
+    for name, table in (('build', built), ('incremental', incremental)):
+        if len(table) != len(entries) or set(table) != set(entries):
+            return f"{name} holds {sorted(table)}, expected {sorted(entries)}"
+
+    words = [random_abbrev(rng) + random_abbrev(rng)[:rng.randint(0, 4)]
+             for _ in range(WORDS_PER_TRIAL)]
+    for name, table in (('build', built), ('incremental', incremental)):
+        typed = KeyBuffer(50)
+        cursor = AbbreviationMatcher(table).cursor(typed)
+        for word in words:
+            expected = reference_type(entries, word)
+            got = cursor_type(cursor, typed, word)
+            if got != expected:
+                return (f"{name} typing {word!r} gave {got}, expected {expected}\n"
+                        f"    entries: {entries}")
+    return None
+
+
+def main():
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else random.randrange(1 << 32)
+    rng = random.Random(seed)
+    for trial in range(trials):
+        failure = run_trial(rng)
+        if failure:
+            print(f"❌ Trial {trial} (seed {seed}): {failure}")
+            sys.exit(1)
+    print(f"{trials} trials passed (seed {seed})")
+
+
+if __name__ == "__main__":
+    main()
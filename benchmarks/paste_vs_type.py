@@ -0,0 +1,144 @@
+"""Benchmark for delivering replacements on X11: typing vs clipboard paste.
+
+Types and pastes snippets from 10 bytes to 100 KB into a Tk text widget
+running in a separate process, and times how long it takes until the whole
+snippet has arrived. Typing uses pynput's Controller (what _expand_xorg does
+for short replacements); pasting uses TkClipboard plus Ctrl+V. Needs Xvfb
+when no X display is available:
+
+    python benchmarks/paste_vs_type.py [max_bytes]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+SIZES = (10, 100, 1_000, 10_000, 100_000)
+DISPLAY = ':97'
+TIMEOUT = 600
+
+# Prints the length of its text widget every time it changes; "clear" on
+# stdin empties it.
+TARGET = r'''
+import sys, threading, tkinter as tk
+root = tk.Tk()
+text = tk.Text(root)
+text.pack()
+def changed(event=None):
+    if text.edit_modified():
+        print(len(text.get('1.0', 'end-1c')), flush=True)
+        text.edit_modified(False)
+def commands():
+    for line in sys.stdin:
+        root.after(0, lambda: (text.delete('1.0', 'end'), print('cleared', flush=True)))
+text.bind('<<Modified>>', changed)
+threading.Thread(target=commands, daemon=True).start()
+root.after(200, lambda: (text.focus_force(), print('ready', flush=True)))
+root.mainloop()
+'''
+
+
+def ensure_display():
+    """Start Xvfb if there is no display; returns the process or None"""
+    if os.environ.get('DISPLAY'):
+        return None
+    if not shutil.which('Xvfb'):
+        sys.exit("No DISPLAY and Xvfb is not installed")
+    server = subprocess.Popen(['Xvfb', DISPLAY, '-screen', '0', '1024x768x24'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = DISPLAY
+    time.sleep(1.0)
+    return server
+
+
+class Target:
+    def __init__(self):
+        self.proc = subprocess.Popen([sys.executable, '-c', TARGET], text=True,
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._wait_for('ready')
+
+    def _wait_for(self, token):
+        for line in self.proc.stdout:
+            if line.strip() == token:
+                return
+        raise RuntimeError("target exited")
+
+    def clear(self):
+        self.proc.stdin.write('clear\n')
+        self.proc.stdin.flush()
+        self._wait_for('cleared')
+
+    def wait_length(self, expected):
+        for line in self.proc.stdout:
+            if line.strip().isdigit() and int(line) >= expected:
+                return
+        raise RuntimeError("target exited")
+
+    def close(self):
+        self.proc.kill()
+
+
+def snippet(size):
+    line = "The quick brown fox jumps over the lazy dog. "
+    return (line * (size // len(line) + 1))[:size]
+
+
+def measure(target, deliver, text):
+    target.clear()
+    start = time.perf_counter()
+    worker = threading.Thread(target=deliver, args=(text,), daemon=True)
+    worker.start()
+    target.wait_length(len(text))
+    elapsed = time.perf_counter() - start
+    worker.join(TIMEOUT)
+    return elapsed
+
+
+def main():
+    max_bytes = int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1]
+    server = ensure_display()
+
+    import tkinter as tk
+    from pynput.keyboard import Controller, Key
+    from Expander.clipboard import TkClipboard
+
+    root = tk.Tk()
+    root.withdraw()
+    clipboard = TkClipboard(root)
+    controller = Controller()
+
+    def paste(text):
+        clipboard.offer(text)
+        with controller.pressed(Key.ctrl):
+            controller.press('v')
+            controller.release('v')
+        clipboard.wait_served(TIMEOUT)
+
+    def run():
+        target = Target()
+        try:
+            print(f"{'bytes':>8} {'type (ms)':>12} {'paste (ms)':>12}")
+            for size in SIZES:
+                if size > max_bytes:
+                    break
+                text = snippet(size)
+                typed = measure(target, controller.type, text)
+                pasted = measure(target, paste, text)
+                print(f"{size:>8} {typed * 1000:>12.1f} {pasted * 1000:>12.1f}")
+        finally:
+            target.close()
+            root.after(0, root.quit)
+
+    # The clipboard owner needs its main loop running to serve the target
+    threading.Thread(target=run, daemon=True).start()
+    root.mainloop()
+    if server:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,39 @@
-from Elements.app import TEx
 from user_files.extract_user_files import setup_user_folder
 from user_files.extract_icon import setup_icon
 import os
 import sys
 
-if __name__ == "__main__":
-    background_mode = '--background' in sys.argv
+def run_store_command(argv):
+    """--export-json PATH / --import-json PATH: copy abbreviations between
+    the store and the Expansions.json format, then exit"""
+    from Elements.snippet_store import SnippetStore
+    for flag in ('--export-json', '--import-json'):
+        if flag in argv:
+            index = argv.index(flag)
+            if index + 1 >= len(argv):
+                sys.exit(f"usage: main.py {flag} PATH")
+            path = argv[index + 1]
+            setup_user_folder()
+            store = SnippetStore()
+            if flag == '--export-json':
+                ok = store.export_json(path)
+                print(f"Exported abbreviations to {path}" if ok else "Export failed")
+            else:
+                print(f"Imported {store.import_json(path)} abbreviations from {path}")
+            store.close()
+            return True
+    return False
+
 
+if __name__ == "__main__":
+    if run_store_command(sys.argv):
+        sys.exit(0)
     setup_icon()
     setup_user_folder()
+    # The GUI (customtkinter, pynput) needs a display; the store commands above don't
+    from Elements.app import TEx
+    background_mode = '--background' in sys.argv
+
     app = TEx(start_hidden=background_mode)
 
     try: